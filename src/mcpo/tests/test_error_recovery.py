@@ -5,6 +5,7 @@
 import pytest
 import asyncio
 import time
+from collections import namedtuple
 from unittest.mock import Mock, AsyncMock, patch
 
 from mcpo.utils.error_recovery import (
@@ -14,6 +15,7 @@ from mcpo.utils.error_recovery import (
     RecoveryAction
 )
 from mcpo.utils.system_monitor import SystemMonitor, SystemMetrics
+from mcpo.utils.keyword_matcher import KeywordMatcher
 
 
 class TestErrorRecoveryManager:
@@ -39,6 +41,19 @@ class TestErrorRecoveryManager:
         assert error_event.context["connection_name"] == "test_conn"
         assert len(error_manager.error_history) == 1
 
+    @pytest.mark.asyncio
+    async def test_error_history_bounded(self):
+        """测试错误历史与活跃错误的数量上限"""
+        error_manager = ErrorRecoveryManager(max_error_history=10)
+        for i in range(60):
+            await error_manager.record_error(f"error_{i}", f"Error {i}", severity=ErrorSeverity.HIGH)
+
+        assert len(error_manager.error_history) == 10
+        assert error_manager.error_history[0].error_type == "error_50"
+        assert len(error_manager.system_health.active_errors) == 50
+        # 事件使用 __slots__，不再携带实例字典
+        assert not hasattr(error_manager.error_history[0], "__dict__")
+
     @pytest.mark.asyncio
     async def test_error_pattern_detection(self, error_manager):
         """测试错误模式检测"""
@@ -58,6 +73,20 @@ class TestErrorRecoveryManager:
         pattern = error_manager._detect_error_pattern("Unknown error")
         assert pattern is None
 
+        # 命中多个模式时按注册顺序优先
+        pattern = error_manager._detect_error_pattern("Session timeout")
+        assert pattern == "connection_timeout"
+
+    def test_add_error_pattern(self, error_manager):
+        """测试注册自定义错误模式"""
+        assert error_manager._detect_error_pattern("Quota exhausted") is None
+
+        strategy = AsyncMock(return_value=True)
+        error_manager.add_error_pattern("quota", ["quota"], strategy)
+
+        assert error_manager._detect_error_pattern("Quota exhausted") == "quota"
+        assert error_manager.recovery_strategies["quota"] is strategy
+
     @pytest.mark.asyncio
     async def test_connection_timeout_recovery(self, error_manager):
         """测试连接超时恢复"""
@@ -124,6 +153,21 @@ class TestErrorRecoveryManager:
         assert stats["total_recovery_attempts"] == 2
         assert stats["recovery_success_rate"] == 0.5
 
+    @pytest.mark.asyncio
+    async def test_error_windows_expire(self, error_manager):
+        """测试过期错误不计入统计窗口"""
+        old_event = await error_manager.record_error("old", "Old error")
+        old_event.timestamp -= 4000
+        error_manager._recent_5m[0] -= 4000
+
+        await error_manager.record_error("new", "New error")
+
+        assert error_manager.system_health.error_rate == 1 / 300.0
+        assert len(error_manager._recent_5m) == 1
+        stats = error_manager.get_error_statistics()
+        assert stats["total_errors_last_hour"] == 1
+        assert stats["error_types"] == {"new": 1}
+
     @pytest.mark.asyncio
     async def test_system_health_update(self, error_manager):
         """测试系统健康状态更新"""
@@ -142,6 +186,30 @@ class TestErrorRecoveryManager:
         assert len(health.active_errors) > 0
 
 
+class TestKeywordMatcher:
+    """测试关键字匹配器"""
+
+    def _check_matcher(self):
+        matcher = KeywordMatcher([("502", 1), ("timeout", 0), ("gateway", 1)])
+        assert matcher.search("http 502 bad gateway")
+        assert not matcher.search("invalid json")
+        assert matcher.best("502 gateway timeout") == 0
+        assert matcher.best("502 bad gateway") == 1
+        assert matcher.best("invalid json") is None
+
+        assert not KeywordMatcher().search("anything")
+        assert KeywordMatcher().best("anything") is None
+
+    def test_keyword_matcher(self):
+        """测试关键字匹配器（默认实现）"""
+        self._check_matcher()
+
+    def test_keyword_matcher_regex_fallback(self):
+        """测试未安装 pyahocorasick 时的正则实现"""
+        with patch('mcpo.utils.keyword_matcher.ahocorasick', new=None):
+            self._check_matcher()
+
+
 class TestSystemMonitor:
     """测试系统监控器"""
 
@@ -152,7 +220,10 @@ class TestSystemMonitor:
     @pytest.mark.asyncio
     async def test_collect_metrics(self, monitor):
         """测试指标收集"""
-        with patch('psutil.cpu_percent', return_value=50.0), \
+        cpu_times = namedtuple("scputimes", "user system idle")
+        # 基线之后忙碌10秒、空闲10秒
+        monitor._cpu_baseline = (time.monotonic() - 30, cpu_times(10.0, 0.0, 10.0))
+        with patch('psutil.cpu_times', return_value=cpu_times(15.0, 5.0, 20.0)), \
              patch('psutil.virtual_memory') as mock_memory:
             
             mock_memory.return_value.percent = 60.0
@@ -165,6 +236,21 @@ class TestSystemMonitor:
             assert metrics.memory_available == 1024 * 1024 * 1024
             assert isinstance(metrics.timestamp, float)
 
+    @pytest.mark.asyncio
+    async def test_cpu_baseline(self, monitor):
+        """测试临时收集指标不推进监控循环的CPU时间基线"""
+        cpu_times = namedtuple("scputimes", "user system idle")
+        baseline = (time.monotonic() - 30, cpu_times(10.0, 0.0, 10.0))
+        monitor._cpu_baseline = baseline
+        with patch('psutil.cpu_times', return_value=cpu_times(25.0, 0.0, 15.0)):
+            assert (await monitor.collect_metrics()).cpu_usage == 75.0
+            assert (await monitor.collect_metrics()).cpu_usage == 75.0
+            assert monitor._cpu_baseline is baseline
+
+            metrics = await monitor._collect_metrics(advance_cpu_baseline=True)
+            assert metrics.cpu_usage == 75.0
+            assert monitor._cpu_baseline[1] == cpu_times(25.0, 0.0, 15.0)
+
     @pytest.mark.asyncio
     async def test_monitoring_lifecycle(self, monitor):
         """测试监控生命周期"""
@@ -250,6 +336,47 @@ class TestSystemMonitor:
         assert summary["cpu_usage"]["min"] == 50.0
         assert summary["cpu_usage"]["max"] == 59.0
 
+    def test_metrics_summary_window(self, monitor):
+        """测试按时间窗口从尾部筛选指标历史"""
+        current_time = time.time()
+        for i in range(30, -1, -1):
+            monitor._add_metrics(SystemMetrics(timestamp=current_time - i * 60, cpu_usage=float(i)))
+
+        summary = monitor.get_metrics_summary(minutes=10)
+        # 时间戳严格晚于截止时间的记录：i = 0..9
+        assert summary["data_points"] == 10
+        assert summary["cpu_usage"]["max"] == 9.0
+        assert summary["cpu_usage"]["min"] == 0.0
+
+    def test_metrics_history_bounded(self, monitor):
+        """测试指标历史数量上限"""
+        for i in range(150):
+            monitor._add_metrics(SystemMetrics(cpu_usage=float(i)))
+
+        assert len(monitor.metrics_history) == 100
+        assert monitor.metrics_history[0].cpu_usage == 50.0
+
+    def test_metrics_ewma(self, monitor):
+        """测试指标的指数加权移动平均"""
+        monitor._add_metrics(SystemMetrics(cpu_usage=10.0))
+        monitor._add_metrics(SystemMetrics(cpu_usage=20.0))
+
+        summary = monitor.get_metrics_summary(minutes=15)
+        assert summary["cpu_usage"]["avg"] == 15.0
+        assert summary["cpu_usage"]["ewma"] == pytest.approx(11.0)
+
+    @pytest.mark.asyncio
+    async def test_thresholds_override(self, monitor):
+        """测试修改 thresholds 后告警检查使用新阈值"""
+        metrics = SystemMetrics(cpu_usage=60.0, cache_hit_rate=1.0)
+        with patch("mcpo.utils.system_monitor.logger") as mock_logger:
+            await monitor._check_alerts(metrics)
+            mock_logger.warning.assert_not_called()
+
+            monitor.thresholds.update({"cpu_usage_warning": 50.0})
+            await monitor._check_alerts(metrics)
+            mock_logger.warning.assert_called_once_with("系统告警: CPU使用率警告: %.1f%%", 60.0)
+
 
 class TestIntegratedErrorRecovery:
     """测试集成错误恢复"""
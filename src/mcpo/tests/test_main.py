@@ -1,8 +1,18 @@
+import anyio
 import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import HTTPException
+from mcp.types import CallToolResult, ImageContent, TextContent
 from pydantic import BaseModel, Field
-from typing import Any, List, Dict, Union
+from typing import Any, List, Dict, Optional, Union
 
-from mcpo.utils.main import _process_schema_property
+from mcpo.utils.main import (
+    _process_schema_property,
+    _execute_tool_request,
+    process_tool_response,
+    get_model_fields,
+    get_tool_handler,
+)
 
 
 _model_cache = {}
@@ -310,3 +320,277 @@ def test_multi_type_property_with_any_of():
 
     # assert result_field parameter config
     assert result_field.description == "A property with multiple types"
+
+
+async def test_execute_tool_request_retries_network_error():
+    session = AsyncMock()
+    session.call_tool = AsyncMock(
+        side_effect=[
+            Exception("502 Bad Gateway"),
+            CallToolResult(content=[TextContent(type="text", text='{"ok": true}')]),
+        ]
+    )
+    connection_manager = MagicMock()
+
+    with patch("mcpo.utils.reconnect_manager.reconnect_manager") as mock_reconnect, patch(
+        "mcpo.utils.main.asyncio.sleep", new=AsyncMock()
+    ) as mock_sleep:
+        mock_reconnect.attempt_reconnect = AsyncMock(return_value=True)
+        mock_reconnect.get_healthy_session = AsyncMock(return_value=session)
+
+        result = await _execute_tool_request(
+            "tool", {"a": 1}, session, "conn", connection_manager
+        )
+
+    assert result == {"ok": True}
+    assert session.call_tool.call_count == 2
+    # 全抖动退避：首次重试的等待时间落在 [0, 1] 区间
+    delay = mock_sleep.call_args.args[0]
+    assert 0 <= delay <= 1
+    connection_manager.record_connection_success.assert_called_once_with("conn")
+
+
+async def test_execute_tool_request_non_network_error_skips_reconnect():
+    session = AsyncMock()
+    session.call_tool = AsyncMock(side_effect=ValueError("bad input"))
+    connection_manager = MagicMock()
+
+    with patch("mcpo.utils.reconnect_manager.reconnect_manager") as mock_reconnect:
+        mock_reconnect.attempt_reconnect = AsyncMock(return_value=True)
+        with pytest.raises(HTTPException) as exc_info:
+            await _execute_tool_request("tool", {}, session, "conn", connection_manager)
+
+    assert exc_info.value.status_code == 500
+    mock_reconnect.attempt_reconnect.assert_not_called()
+
+
+async def test_execute_tool_request_network_exception_type():
+    session = AsyncMock()
+    # 消息中没有网络关键字，按异常类型识别为网络错误
+    session.call_tool = AsyncMock(side_effect=anyio.ClosedResourceError())
+    connection_manager = MagicMock()
+
+    with patch("mcpo.utils.reconnect_manager.reconnect_manager") as mock_reconnect, patch(
+        "mcpo.utils.main.asyncio.sleep", new=AsyncMock()
+    ):
+        mock_reconnect.attempt_reconnect = AsyncMock(return_value=False)
+        with pytest.raises(HTTPException) as exc_info:
+            await _execute_tool_request("tool", {}, session, "conn", connection_manager)
+
+    assert exc_info.value.status_code == 503
+    assert mock_reconnect.attempt_reconnect.call_count == 3
+
+
+async def test_execute_tool_request_failure_invalidates_healthy_cache():
+    from mcpo.utils.reconnect_manager import ReconnectManager
+
+    manager = ReconnectManager()
+    session = AsyncMock()
+    session.call_tool = AsyncMock(
+        side_effect=[
+            CallToolResult(content=[TextContent(type="text", text="ok")]),
+            Exception("502 Bad Gateway"),
+            Exception("502 Bad Gateway"),
+            Exception("502 Bad Gateway"),
+            Exception("502 Bad Gateway"),
+        ]
+    )
+    session.list_tools = AsyncMock(side_effect=Exception("502 Bad Gateway"))
+    manager.register_connection("conn", session, AsyncMock(), {})
+    connection_manager = MagicMock()
+
+    with patch("mcpo.utils.reconnect_manager.reconnect_manager", manager), patch(
+        "mcpo.utils.main.asyncio.sleep", new=AsyncMock()
+    ):
+        assert await _execute_tool_request("tool", {}, session, "conn", connection_manager) == "ok"
+        assert manager.connection_status["conn"]["healthy_until"] > 0
+
+        with pytest.raises(HTTPException) as exc_info:
+            await _execute_tool_request("tool", {}, session, "conn", connection_manager)
+
+    # 成功后的健康标记不能掩盖随后的失败：会重新探测并记录错误
+    assert exc_info.value.status_code == 503
+    assert session.list_tools.await_count > 0
+    assert manager.connection_status["conn"]["status"] == "error"
+
+
+def test_process_tool_response_content_types():
+    result = CallToolResult(
+        content=[
+            TextContent(type="text", text='{"a": 1}'),
+            TextContent(type="text", text=" [1, 2]"),
+            TextContent(type="text", text="plain text"),
+            TextContent(type="text", text="null-ish but not json"),
+            ImageContent(type="image", data="aGVsbG8=", mimeType="image/png"),
+        ]
+    )
+
+    assert process_tool_response(result) == [
+        {"a": 1},
+        [1, 2],
+        "plain text",
+        "null-ish but not json",
+        "data:image/png;base64,aGVsbG8=",
+    ]
+
+
+def test_process_tool_response_exact_numbers():
+    result = CallToolResult(
+        content=[
+            TextContent(
+                type="text",
+                text='{"id": 18446744073709551616, "amount": 123456789012345678901234567890}',
+            ),
+            TextContent(type="text", text="-9223372036854775809"),
+            TextContent(type="text", text='{"x": NaN}'),
+            TextContent(type="text", text="-Infinity"),
+            TextContent(type="text", text="1e400"),
+        ]
+    )
+
+    response = process_tool_response(result)
+    # 超出64位的整数保持精确值，不被转成浮点数
+    assert response[0] == {"id": 2 ** 64, "amount": 123456789012345678901234567890}
+    assert response[1] == -(2 ** 63) - 1
+    assert isinstance(response[1], int)
+    # orjson 不支持的字面量仍按标准库 json 解析
+    assert response[2]["x"] != response[2]["x"]
+    assert response[3] == float("-inf")
+    assert response[4] == float("inf")
+
+
+def test_get_model_fields_cached_by_schema():
+    properties = {"name": {"type": "string"}, "age": {"type": "integer"}}
+
+    fields1 = get_model_fields("cached_form_model", properties, ["name"])
+    fields2 = get_model_fields(
+        "cached_form_model", {"age": {"type": "integer"}, "name": {"type": "string"}}, ["name"]
+    )
+    assert fields1 is fields2
+
+    # schema 或模型名不同则重新生成
+    assert get_model_fields("cached_form_model", properties, []) is not fields1
+    assert get_model_fields("other_form_model", properties, ["name"]) is not fields1
+
+    session = AsyncMock()
+    handler1 = get_tool_handler(session, "cached", fields1)
+    handler2 = get_tool_handler(session, "cached", fields2)
+    form_model = handler1.__annotations__["form_data"]
+    assert form_model is handler2.__annotations__["form_data"]
+    assert form_model.model_fields["name"].is_required()
+
+
+async def test_tool_handler_keeps_reconnected_session():
+    ok = CallToolResult(content=[TextContent(type="text", text="done")])
+    old_session = AsyncMock()
+    old_session.call_tool = AsyncMock(side_effect=Exception("502 Bad Gateway"))
+    new_session = AsyncMock()
+    new_session.call_tool = AsyncMock(return_value=ok)
+
+    handler = get_tool_handler(old_session, "tool", {}, connection_manager=MagicMock())
+
+    with patch("mcpo.utils.reconnect_manager.reconnect_manager") as mock_reconnect, patch(
+        "mcpo.utils.main.asyncio.sleep", new=AsyncMock()
+    ):
+        mock_reconnect.attempt_reconnect = AsyncMock(return_value=True)
+        mock_reconnect.get_healthy_session = AsyncMock(return_value=new_session)
+
+        assert await handler() == "done"
+        assert await handler() == "done"
+
+    # 重连之后的调用直接使用新会话
+    assert old_session.call_tool.call_count == 1
+    assert new_session.call_tool.call_count == 2
+    new_session.call_tool.assert_called_with("tool", {})
+
+
+def test_nested_model_shared_across_registrations():
+    schema = {
+        "type": "object",
+        "properties": {"id": {"type": "integer"}},
+        "required": ["id"],
+    }
+    # 每次注册工具都会使用新的局部缓存，相同schema仍应复用同一个模型类
+    result_type1, _ = _process_schema_property({}, schema, "shared", "obj", True)
+    result_type2, _ = _process_schema_property({}, schema, "shared", "obj", True)
+    assert result_type1 is result_type2
+    assert result_type1.model_validate({"id": 1}).id == 1
+
+
+async def test_tool_handler_sends_only_provided_args():
+    ok = CallToolResult(content=[TextContent(type="text", text="done")])
+    session = AsyncMock()
+    session.call_tool = AsyncMock(return_value=ok)
+    form_fields = get_model_fields(
+        "args_form",
+        {
+            "name": {"type": "string"},
+            "limit": {"type": "integer", "default": 10},
+            "tag": {"anyOf": [{"type": "string"}, {"type": "null"}]},
+        },
+        ["name"],
+    )
+    handler = get_tool_handler(session, "tool", form_fields, connection_manager=MagicMock())
+    FormModel = handler.__annotations__["form_data"]
+
+    await handler(FormModel(name="a", tag=None))
+
+    # 未提供的默认值和None都不会发送
+    session.call_tool.assert_called_once_with("tool", {"name": "a"})
+
+
+def test_ref_target_model_built_once():
+    schema_defs = {
+        "Point": {
+            "type": "object",
+            "description": "坐标",
+            "properties": {"x": {"type": "integer"}, "y": {"type": "integer"}},
+        }
+    }
+    properties = {
+        "start": {"$ref": "#/$defs/Point"},
+        "end": {"$ref": "#/$defs/Point"},
+    }
+    fields = get_model_fields("ref_form_model", properties, ["start"], schema_defs)
+
+    start_type, start_field = fields["start"]
+    end_type, end_field = fields["end"]
+    assert start_type is end_type
+    assert start_field.is_required()
+    assert not end_field.is_required()
+
+
+def test_any_of_nullable_union():
+    result_type, _ = _process_schema_property(
+        {}, {"anyOf": [{"type": "string"}, {"type": "null"}]}, "test", "nullable", False
+    )
+    assert result_type == Optional[str]
+
+    result_type, _ = _process_schema_property(
+        {}, {"type": ["array", "string"], "items": {"type": "integer"}}, "test", "mixed", False
+    )
+    assert result_type == Union[List[int], str]
+
+
+async def test_tool_handler_dumps_nested_args():
+    ok = CallToolResult(content=[TextContent(type="text", text="done")])
+    session = AsyncMock()
+    session.call_tool = AsyncMock(return_value=ok)
+    form_fields = get_model_fields(
+        "nested_args_form",
+        {
+            "point": {
+                "type": "object",
+                "properties": {"x": {"type": "integer"}, "y": {"type": "integer"}},
+            },
+            "tags": {"type": "array", "items": {"type": "string"}},
+        },
+        ["point"],
+    )
+    handler = get_tool_handler(session, "tool", form_fields, connection_manager=MagicMock())
+    FormModel = handler.__annotations__["form_data"]
+
+    await handler(FormModel(point={"x": 1}, tags=["a"]))
+
+    # 嵌套模型转换为普通字典，只包含提供的字段
+    session.call_tool.assert_called_once_with("tool", {"point": {"x": 1}, "tags": ["a"]})
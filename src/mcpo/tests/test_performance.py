@@ -6,15 +6,17 @@
 import pytest
 import asyncio
 import time
-from unittest.mock import AsyncMock, MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 
 from mcpo.utils.cache import SmartCache, CacheStrategy, cache_manager
 from mcpo.utils.connection_pool import ConnectionPool, ConnectionPoolConfig
 from mcpo.utils.performance import (
     ConcurrencyLimiter, 
     RequestDeduplicator, 
+    BatchProcessor,
     PerformanceMonitor,
-    performance_monitor
+    performance_monitor,
+    _RequestWindow,
 )
 
 
@@ -164,6 +166,7 @@ class TestConcurrencyLimiter:
         stats = limiter.get_stats()
         assert stats['max_concurrent'] == 2
         assert stats['peak_concurrent'] <= 2
+        assert stats['current_concurrent'] == 0
 
 
 class TestRequestDeduplicator:
@@ -195,6 +198,104 @@ class TestRequestDeduplicator:
         
         await deduplicator.close()
 
+    async def test_request_deduplication_shares_failure(self):
+        """测试失败结果由所有等待方共享，不会重复执行"""
+        deduplicator = RequestDeduplicator(ttl=1.0)
+        call_count = 0
+
+        async def failing_executor():
+            nonlocal call_count
+            call_count += 1
+            await asyncio.sleep(0.05)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(
+            *[
+                deduplicator.execute_or_wait("test_endpoint", {"arg": "value"}, failing_executor)
+                for _ in range(3)
+            ],
+            return_exceptions=True,
+        )
+
+        assert call_count == 1
+        assert all(isinstance(result, ValueError) for result in results)
+        assert not deduplicator._pending_requests
+
+        await deduplicator.close()
+
+    async def test_max_pending(self):
+        """测试进行中的请求数超过上限时不再参与去重"""
+        deduplicator = RequestDeduplicator(max_pending=1)
+        release = asyncio.Event()
+        call_count = 0
+
+        async def executor():
+            nonlocal call_count
+            call_count += 1
+            await release.wait()
+            return call_count
+
+        tasks = [
+            asyncio.create_task(deduplicator.execute_or_wait("ep", {"i": i}, executor))
+            for i in range(2)
+        ]
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert len(deduplicator._pending_requests) == 1
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert call_count == 2
+        assert not deduplicator._pending_requests
+
+        await deduplicator.close()
+
+    def test_generate_key(self):
+        """测试请求键与参数顺序无关"""
+        deduplicator = RequestDeduplicator()
+        key = deduplicator._generate_key("ep", {"a": 1, "b": [1, 2]})
+        assert key == deduplicator._generate_key("ep", {"b": [1, 2], "a": 1})
+        assert key != deduplicator._generate_key("ep", {"a": 2, "b": [1, 2]})
+        assert key != deduplicator._generate_key("other", {"a": 1, "b": [1, 2]})
+
+        # 未安装 xxhash 时退回 hashlib
+        with patch("mcpo.utils.performance.xxhash", None):
+            fallback_key = deduplicator._generate_key("ep", {"a": 1, "b": [1, 2]})
+            assert fallback_key == deduplicator._generate_key("ep", {"b": [1, 2], "a": 1})
+        assert isinstance(fallback_key, str)
+
+        # orjson 不支持的超过64位的整数退回标准库 json
+        big_key = deduplicator._generate_key("ep", {"id": 2 ** 70})
+        assert big_key == deduplicator._generate_key("ep", {"id": 2 ** 70})
+        assert big_key != deduplicator._generate_key("ep", {"id": 2 ** 70 + 1})
+
+
+class TestBatchProcessor:
+    """测试批处理器"""
+
+    async def test_batch_by_timeout_and_size(self):
+        """测试定时器触发和批次满触发的批处理"""
+        async def executor(args):
+            await asyncio.sleep(0.01)
+            return args["i"]
+
+        # 未达到批次大小，由定时器触发
+        processor = BatchProcessor(batch_size=10, batch_timeout=0.01)
+        results = await asyncio.wait_for(
+            asyncio.gather(*[processor.add_request("ep", {"i": i}, executor) for i in range(3)]),
+            timeout=1.0,
+        )
+        assert results == [0, 1, 2]
+        assert not processor._batch_timers
+
+        # 达到批次大小立即处理
+        processor = BatchProcessor(batch_size=2, batch_timeout=10.0)
+        results = await asyncio.wait_for(
+            asyncio.gather(*[processor.add_request("ep", {"i": i}, executor) for i in range(4)]),
+            timeout=1.0,
+        )
+        assert results == [0, 1, 2, 3]
+
 
 class TestPerformanceMonitor:
     """测试性能监控器"""
@@ -219,6 +320,22 @@ class TestPerformanceMonitor:
         assert metrics['total_requests'] == 2
         assert metrics['success_rate'] == 50.0
         assert metrics['avg_duration'] > 0
+        assert metrics['qps_1s'] == 2
+
+    def test_request_window(self):
+        """测试最近请求环形缓冲区"""
+        window = _RequestWindow(3)
+        assert window.count_since(0, 0) == (0, 0)
+
+        for ts in (1, 2, 3, 4, 5):
+            window.append(ts, 0.1, True)
+
+        # 只保留最近3条
+        assert window.count == 3
+        assert window.count_since(0, 0) == (3, 3)
+        assert window.count_since(5, 4) == (1, 2)
+        assert window.count_since(6, 4) == (0, 2)
+        assert window.count_since(6, 6) == (0, 0)
 
 
 class TestIntegratedPerformance:
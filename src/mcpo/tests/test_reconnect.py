@@ -10,6 +10,7 @@ from unittest.mock import AsyncMock, MagicMock, patch
 from httpx import HTTPStatusError, Response, Request
 
 from mcpo.utils.reconnect_manager import (
+    _MAX_CONCURRENT_PROBES,
     ReconnectManager, 
     handle_connection_error,
     resilient_streamable_connection
@@ -55,6 +56,28 @@ class TestReconnectManager:
         assert "test_conn" in manager.connections
         assert "test_conn" in manager.connection_status
         assert manager.connection_status["test_conn"]["status"] == "healthy"
+
+        # 状态视图只读且随状态更新，快照与内部状态互不影响
+        view = manager.get_all_status()
+        with pytest.raises(TypeError):
+            view["other"] = {}
+        snapshot = manager.snapshot_status()
+        manager.record_error("test_conn", "Error")
+        assert view["test_conn"]["status"] == "error"
+        assert snapshot["test_conn"]["status"] == "healthy"
+
+    def test_connection_count(self, manager, mock_session, mock_connection_factory):
+        """测试注册/注销时维护的连接计数"""
+        config = {"url": "https://test.com", "headers": {}}
+        manager.register_connection("a", mock_session, mock_connection_factory, config)
+        manager.register_connection("b", mock_session, mock_connection_factory, config)
+        # 重复注册同名连接不重复计数
+        manager.register_connection("a", mock_session, mock_connection_factory, config)
+        assert manager._connection_count == 2
+
+        manager.unregister_connection("a")
+        manager.unregister_connection("missing")
+        assert manager._connection_count == 1 == len(manager.connections)
     
     def test_record_error(self, manager, mock_session, mock_connection_factory):
         """测试错误记录"""
@@ -85,6 +108,13 @@ class TestReconnectManager:
         # 重连次数过多后不应该重连
         manager.connection_status["test_conn"]["reconnect_attempts"] = 6
         assert not manager.should_reconnect("test_conn")
+
+        # 30秒内刚重连过不应该再次重连（按monotonic时间判断）
+        manager.connection_status["test_conn"]["reconnect_attempts"] = 0
+        manager.connection_status["test_conn"]["last_reconnect_mono"] = time.monotonic()
+        assert not manager.should_reconnect("test_conn")
+        manager.connection_status["test_conn"]["last_reconnect_mono"] = time.monotonic() - 31
+        assert manager.should_reconnect("test_conn")
     
     async def test_attempt_reconnect_success(self, manager, mock_session, mock_connection_factory):
         """测试成功重连"""
@@ -114,7 +144,19 @@ class TestReconnectManager:
                 assert success
                 assert manager.connection_status["test_conn"]["status"] == "healthy"
                 assert manager.connection_status["test_conn"]["error_count"] == 0
+
+                # 重连时的 list_tools 测试已确认健康，随后获取会话不再重复探测
+                assert await manager.get_healthy_session("test_conn") is mock_new_session
+                mock_new_session.list_tools.assert_awaited_once()
     
+    async def test_attempt_reconnect_healthy_skips_lock(self, manager, mock_session, mock_connection_factory):
+        """测试连接已健康时不等待重连锁"""
+        config = {"url": "https://test.com", "headers": {}}
+        manager.register_connection("test_conn", mock_session, mock_connection_factory, config)
+
+        async with manager.reconnect_locks["test_conn"]:
+            assert await asyncio.wait_for(manager.attempt_reconnect("test_conn"), timeout=0.5)
+
     async def test_get_healthy_session(self, manager, mock_session, mock_connection_factory):
         """测试获取健康会话"""
         config = {"url": "https://test.com", "headers": {}}
@@ -140,6 +182,93 @@ class TestReconnectManager:
             session = await manager.get_healthy_session("test_conn")
             mock_reconnect.assert_called_once_with("test_conn")
 
+    async def test_get_healthy_session_skips_recent_probe(self, manager, mock_session, mock_connection_factory):
+        """测试刚确认健康的会话跳过探测"""
+        config = {"url": "https://test.com", "headers": {}}
+        manager.register_connection("test_conn", mock_session, mock_connection_factory, config)
+
+        manager.mark_healthy("test_conn")
+        assert await manager.get_healthy_session("test_conn") is mock_session
+        mock_session.list_tools.assert_not_called()
+
+        # 记录错误后重新探测
+        manager.record_error("test_conn", "Error")
+        assert await manager.get_healthy_session("test_conn") is mock_session
+        mock_session.list_tools.assert_called_once()
+
+        # 探测成功后在有效期内不再探测
+        assert await manager.get_healthy_session("test_conn") is mock_session
+        mock_session.list_tools.assert_called_once()
+        assert manager.connection_status["test_conn"]["healthy_until"] > time.monotonic()
+
+        # 工具调用失败后，即使仍在有效期内也要重新探测
+        manager.mark_unhealthy("test_conn")
+        assert await manager.get_healthy_session("test_conn") is mock_session
+        assert mock_session.list_tools.call_count == 2
+
+    async def test_validate_all_connections(self, manager, mock_connection_factory):
+        """测试并发验证所有连接"""
+        in_flight = 0
+        peak = 0
+        both_started = asyncio.Event()
+
+        async def slow_probe():
+            # 两个探测都进入后才返回：串行执行时这里会一直等到超时
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            if in_flight == 2:
+                both_started.set()
+            try:
+                await both_started.wait()
+            finally:
+                in_flight -= 1
+
+        config = {"url": "https://test.com", "headers": {}}
+        for name in ("conn_a", "conn_b"):
+            session = AsyncMock()
+            session.list_tools = AsyncMock(side_effect=slow_probe)
+            manager.register_connection(name, session, mock_connection_factory, config)
+        broken = AsyncMock()
+        broken.list_tools = AsyncMock(side_effect=Exception("Connection failed"))
+        manager.register_connection("conn_c", broken, mock_connection_factory, config)
+
+        results = await manager.validate_all_connections()
+
+        assert results == {"conn_a": True, "conn_b": True, "conn_c": False}
+        assert peak == 2
+
+    async def test_validate_all_connections_bounded(self, manager, mock_connection_factory):
+        """测试同时进行的探测数量不超过上限"""
+        in_flight = 0
+        peak = 0
+        limit_reached = asyncio.Event()
+
+        async def probe():
+            # 达到上限前的探测都在此等待，保证峰值确实触及上限
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            if in_flight == _MAX_CONCURRENT_PROBES:
+                limit_reached.set()
+            try:
+                await limit_reached.wait()
+                await asyncio.sleep(0)
+            finally:
+                in_flight -= 1
+
+        config = {"url": "https://test.com", "headers": {}}
+        names = [f"conn_{i}" for i in range(_MAX_CONCURRENT_PROBES + 4)]
+        for name in names:
+            session = AsyncMock()
+            session.list_tools = AsyncMock(side_effect=probe)
+            manager.register_connection(name, session, mock_connection_factory, config)
+
+        results = await manager.validate_all_connections()
+
+        assert results == {name: True for name in names}
+        assert peak == _MAX_CONCURRENT_PROBES
+
 
 class TestConnectionErrorHandling:
     """测试连接错误处理"""
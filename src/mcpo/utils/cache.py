@@ -8,10 +8,12 @@ import time
 import hashlib
 import json
 import logging
+import sys
 from typing import Any, Dict, Optional, Union, Callable, Tuple
 from dataclasses import dataclass, field
 from collections import OrderedDict
 from enum import Enum
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
@@ -319,6 +321,33 @@ def cache_key_for_tool(tool_name: str, args: Dict[str, Any]) -> str:
     return cache_manager.default_cache._generate_key(tool_name, args)
 
 
+@lru_cache(maxsize=1024)
+def _is_time_related_tool(tool_name: str) -> bool:
+    """工具名是否与时间相关（结果只取决于工具名，按名称缓存）"""
+    time_related_tools = ["time", "clock", "now", "current"]
+    name = tool_name.lower()
+    return any(keyword in name for keyword in time_related_tools)
+
+
+@lru_cache(maxsize=1024)
+def _cache_ttl_for_tool(tool_name: str) -> Optional[float]:
+    """按工具名确定缓存TTL（结果只取决于工具名，按名称缓存）"""
+    name = tool_name.lower()
+
+    # 静态数据可以缓存更久
+    static_tools = ["list", "info", "schema", "help"]
+    if any(keyword in name for keyword in static_tools):
+        return 3600  # 1小时
+
+    # 动态数据缓存时间较短
+    dynamic_tools = ["search", "query", "fetch"]
+    if any(keyword in name for keyword in dynamic_tools):
+        return 60  # 1分钟
+
+    # 默认5分钟
+    return 300
+
+
 def should_cache_response(tool_name: str, args: Dict[str, Any], response: Any) -> bool:
     """判断响应是否应该被缓存"""
     # 可以根据工具类型、参数、响应大小等决定是否缓存
@@ -328,13 +357,11 @@ def should_cache_response(tool_name: str, args: Dict[str, Any], response: Any) -
         return False
     
     # 不缓存过大的响应（超过1MB）
-    import sys
     if sys.getsizeof(response) > 1024 * 1024:
         return False
     
     # 某些工具可能不适合缓存（如时间相关的工具）
-    time_related_tools = ["time", "clock", "now", "current"]
-    if any(keyword in tool_name.lower() for keyword in time_related_tools):
+    if _is_time_related_tool(tool_name):
         return False
     
     return True
@@ -342,17 +369,5 @@ def should_cache_response(tool_name: str, args: Dict[str, Any], response: Any) -
 
 def get_cache_ttl(tool_name: str, args: Dict[str, Any]) -> Optional[float]:
     """根据工具类型确定缓存TTL"""
-    # 可以根据工具特性设置不同的TTL
-    
-    # 静态数据可以缓存更久
-    static_tools = ["list", "info", "schema", "help"]
-    if any(keyword in tool_name.lower() for keyword in static_tools):
-        return 3600  # 1小时
-    
-    # 动态数据缓存时间较短
-    dynamic_tools = ["search", "query", "fetch"]
-    if any(keyword in tool_name.lower() for keyword in dynamic_tools):
-        return 60  # 1分钟
-    
-    # 默认5分钟
-    return 300
+    # 目前只按工具名区分，参数暂未参与判断
+    return _cache_ttl_for_tool(tool_name)
@@ -6,11 +6,15 @@
 import asyncio
 import logging
 import time
-from typing import Dict, List, Optional, Any, Callable
+from typing import Deque, Dict, List, Optional, Any, Callable
+from collections import deque
 from dataclasses import dataclass, field
 from enum import Enum
 import json
 
+from . import reconnect_manager as _reconnect
+from .keyword_matcher import KeywordMatcher
+
 logger = logging.getLogger(__name__)
 
 
@@ -31,7 +35,7 @@ class RecoveryAction(Enum):
     ESCALATE = "escalate"
 
 
-@dataclass
+@dataclass(slots=True)
 class ErrorEvent:
     """错误事件"""
     timestamp: float
@@ -44,14 +48,14 @@ class ErrorEvent:
     recovery_action: Optional[RecoveryAction] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class SystemHealth:
     """系统健康状态"""
     overall_status: str = "healthy"
     connection_health: Dict[str, bool] = field(default_factory=dict)
     error_rate: float = 0.0
     last_check: float = field(default_factory=time.time)
-    active_errors: List[ErrorEvent] = field(default_factory=list)
+    active_errors: Deque[ErrorEvent] = field(default_factory=lambda: deque(maxlen=50))
     performance_metrics: Dict[str, float] = field(default_factory=dict)
 
 
@@ -60,10 +64,12 @@ class ErrorRecoveryManager:
     
     def __init__(self, max_error_history: int = 1000):
         self.max_error_history = max_error_history
-        self.error_history: List[ErrorEvent] = []
+        # maxlen 自动淘汰最旧的记录，追加为O(1)
+        self.error_history: Deque[ErrorEvent] = deque(maxlen=max_error_history)
+        # 最近5分钟的错误时间戳，按时间顺序追加，过期的从左侧弹出
+        self._recent_5m: Deque[float] = deque()
         self.recovery_strategies: Dict[str, Callable] = {}
         self.system_health = SystemHealth()
-        self._lock = asyncio.Lock()
         
         # 错误模式检测
         self.error_patterns = {
@@ -86,6 +92,27 @@ class ErrorRecoveryManager:
             "rate_limit": self._handle_rate_limit,
             "authentication": self._handle_authentication_error
         })
+        self._build_pattern_matcher()
+
+    def _build_pattern_matcher(self):
+        """把所有错误模式的关键字编译进同一个匹配器，值为模式的优先级（注册顺序）"""
+        self._pattern_names = list(self.error_patterns)
+        self._pattern_matcher = KeywordMatcher(
+            (keyword.lower(), priority)
+            for priority, keywords in enumerate(self.error_patterns.values())
+            for keyword in keywords
+        )
+        self._patterns_dirty = False
+
+    def add_error_pattern(self,
+                          pattern: str,
+                          keywords: List[str],
+                          strategy: Optional[Callable] = None):
+        """注册自定义错误模式，自动机在下次检测时重建"""
+        self.error_patterns[pattern] = list(keywords)
+        if strategy is not None:
+            self.recovery_strategies[pattern] = strategy
+        self._patterns_dirty = True
 
     async def record_error(self, 
                           error_type: str, 
@@ -93,26 +120,23 @@ class ErrorRecoveryManager:
                           context: Dict[str, Any] = None,
                           severity: ErrorSeverity = ErrorSeverity.MEDIUM) -> ErrorEvent:
         """记录错误事件"""
-        async with self._lock:
-            event = ErrorEvent(
-                timestamp=time.time(),
-                error_type=error_type,
-                error_message=error_message,
-                severity=severity,
-                context=context or {}
-            )
-            
-            self.error_history.append(event)
-            
-            # 限制历史记录大小
-            if len(self.error_history) > self.max_error_history:
-                self.error_history = self.error_history[-self.max_error_history:]
-            
-            # 更新系统健康状态
-            await self._update_system_health(event)
-            
-            logger.warning(f"记录错误事件: {error_type} - {error_message}")
-            return event
+        event = ErrorEvent(
+            timestamp=time.time(),
+            error_type=error_type,
+            error_message=error_message,
+            severity=severity,
+            context=context or {}
+        )
+        
+        # deque.append 在GIL下是原子操作，无需加锁
+        self.error_history.append(event)
+        self._recent_5m.append(event.timestamp)
+        
+        # 更新系统健康状态（只做简单字段读写，无需锁保护）
+        self._update_system_health(event)
+        
+        logger.warning(f"记录错误事件: {error_type} - {error_message}")
+        return event
 
     async def attempt_recovery(self, error_event: ErrorEvent) -> bool:
         """尝试错误恢复"""
@@ -143,14 +167,12 @@ class ErrorRecoveryManager:
             return False
 
     def _detect_error_pattern(self, error_message: str) -> Optional[str]:
-        """检测错误模式"""
-        error_lower = error_message.lower()
-        
-        for pattern, keywords in self.error_patterns.items():
-            if any(keyword in error_lower for keyword in keywords):
-                return pattern
-        
-        return None
+        """检测错误模式（命中多个模式时按注册顺序取优先者）"""
+        if self._patterns_dirty:
+            self._build_pattern_matcher()
+
+        best = self._pattern_matcher.best(error_message.lower())
+        return self._pattern_names[best] if best is not None else None
 
     async def _handle_connection_timeout(self, error_event: ErrorEvent) -> bool:
         """处理连接超时错误"""
@@ -161,8 +183,7 @@ class ErrorRecoveryManager:
                 return False
             
             # 尝试重连
-            from .reconnect_manager import reconnect_manager
-            success = await reconnect_manager.attempt_reconnect(connection_name)
+            success = await _reconnect.reconnect_manager.attempt_reconnect(connection_name)
             
             error_event.recovery_action = RecoveryAction.RECONNECT
             return success
@@ -191,8 +212,7 @@ class ErrorRecoveryManager:
                 return False
             
             # 重置会话
-            from .reconnect_manager import reconnect_manager
-            success = await reconnect_manager.attempt_reconnect(connection_name)
+            success = await _reconnect.reconnect_manager.attempt_reconnect(connection_name)
             
             error_event.recovery_action = RecoveryAction.RESET_SESSION
             return success
@@ -225,13 +245,15 @@ class ErrorRecoveryManager:
             logger.error(f"处理认证错误失败: {str(e)}")
             return False
 
-    async def _update_system_health(self, error_event: ErrorEvent):
+    def _update_system_health(self, error_event: ErrorEvent):
         """更新系统健康状态"""
         try:
-            # 计算错误率
-            recent_errors = [e for e in self.error_history 
-                           if time.time() - e.timestamp < 300]  # 最近5分钟
-            self.system_health.error_rate = len(recent_errors) / 300.0
+            # 计算错误率（最近5分钟，弹出过期时间戳，均摊O(1)）
+            now = time.time()
+            recent_5m = self._recent_5m
+            while recent_5m and now - recent_5m[0] >= 300:
+                recent_5m.popleft()
+            self.system_health.error_rate = len(recent_5m) / 300.0
             
             # 更新整体状态
             if self.system_health.error_rate > 0.1:  # 每秒超过0.1个错误
@@ -241,13 +263,9 @@ class ErrorRecoveryManager:
             else:
                 self.system_health.overall_status = "healthy"
             
-            # 添加到活跃错误列表
+            # 添加到活跃错误列表（deque 限制最多50条）
             if error_event.severity in [ErrorSeverity.HIGH, ErrorSeverity.CRITICAL]:
                 self.system_health.active_errors.append(error_event)
-                
-                # 限制活跃错误数量
-                if len(self.system_health.active_errors) > 50:
-                    self.system_health.active_errors = self.system_health.active_errors[-50:]
             
             self.system_health.last_check = time.time()
             
@@ -261,8 +279,13 @@ class ErrorRecoveryManager:
     def get_error_statistics(self) -> Dict[str, Any]:
         """获取错误统计信息"""
         try:
-            recent_errors = [e for e in self.error_history 
-                           if time.time() - e.timestamp < 3600]  # 最近1小时
+            # 历史按时间顺序追加，从尾部向前取最近1小时，遇到更早的记录即停止
+            now = time.time()
+            recent_errors = []
+            for e in reversed(self.error_history):
+                if now - e.timestamp >= 3600:
+                    break
+                recent_errors.append(e)
             
             error_types = {}
             recovery_success_rate = 0
@@ -0,0 +1,80 @@
+"""
+多关键字匹配工具
+安装了 pyahocorasick 时使用Aho-Corasick自动机单次扫描文本，
+否则退回到预编译的正则表达式（同样由C实现的匹配引擎执行）
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import ahocorasick  # 可选依赖 pyahocorasick（C实现）
+except ImportError:
+    ahocorasick = None
+
+
+def _compile_alternation(words: Iterable[str]) -> "re.Pattern[str]":
+    """把关键字编译为一个正则，较长的关键字优先"""
+    return re.compile("|".join(map(re.escape, sorted(words, key=len, reverse=True))))
+
+
+class KeywordMatcher:
+    """
+    关键字匹配器
+    每个关键字关联一个可比较的值，值越小优先级越高；
+    同一关键字出现多次时保留优先级最高的值
+    """
+
+    def __init__(self, words: Iterable[Tuple[str, Any]] = ()):
+        values: Dict[str, Any] = {}
+        for word, value in words:
+            if word not in values or value < values[word]:
+                values[word] = value
+
+        self._automaton = None
+        self._any_regex: Optional["re.Pattern[str]"] = None
+        self._value_regexes: List[Tuple[Any, "re.Pattern[str]"]] = []
+        self._min_value = min(values.values()) if values else None
+
+        if not values:
+            return
+
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for word, value in values.items():
+                self._automaton.add_word(word, value)
+            self._automaton.make_automaton()
+        else:
+            groups: Dict[Any, List[str]] = {}
+            for word, value in values.items():
+                groups.setdefault(value, []).append(word)
+            self._any_regex = _compile_alternation(values)
+            self._value_regexes = [
+                (value, _compile_alternation(groups[value])) for value in sorted(groups)
+            ]
+
+    def search(self, text: str) -> bool:
+        """文本中是否包含任一关键字"""
+        if self._automaton is not None:
+            for _ in self._automaton.iter(text):
+                return True
+            return False
+        if self._any_regex is not None:
+            return self._any_regex.search(text) is not None
+        return False
+
+    def best(self, text: str) -> Optional[Any]:
+        """返回文本中命中关键字的最高优先级值，未命中时返回None"""
+        if self._automaton is not None:
+            best = None
+            for _, value in self._automaton.iter(text):
+                if best is None or value < best:
+                    best = value
+                    if best == self._min_value:
+                        break
+            return best
+
+        for value, regex in self._value_regexes:
+            if regex.search(text):
+                return value
+        return None
@@ -1,11 +1,23 @@
 import asyncio
+import hashlib
+import importlib
 import json
+import random
+import re
 import time
 import logging
-from typing import Any, Dict, ForwardRef, List, Optional, Type, Union
+from typing import Any, Dict, ForwardRef, List, Optional, Type, Union, get_args
 
+import anyio
+import httpx
+import orjson
 from fastapi import HTTPException
 
+try:
+    import xxhash  # 可选依赖，非加密哈希
+except ImportError:
+    xxhash = None
+
 from mcp import ClientSession, types
 
 logger = logging.getLogger(__name__)
@@ -20,9 +32,12 @@ from mcp.types import (
 
 from mcp.shared.exceptions import McpError
 
-from pydantic import Field, create_model
+from pydantic import BaseModel, ConfigDict, Field, create_model
 from pydantic.fields import FieldInfo
 
+from mcpo.utils import reconnect_manager as _reconnect
+from mcpo.utils.keyword_matcher import KeywordMatcher
+
 # 专注于核心功能，移除性能优化组件
 
 MCP_ERROR_TO_HTTP_STATUS = {
@@ -33,28 +48,166 @@ MCP_ERROR_TO_HTTP_STATUS = {
     INTERNAL_ERROR: 500,
 }
 
+# 无参数工具共用的空参数字典，只读使用
+_EMPTY_ARGS: Dict[str, Any] = {}
+
+# 错误响应的 detail 模板，固定内容直接复用，只读使用
+_DETAIL_NO_SESSION = {"message": "MCP服务器连接不可用", "error": "无法获取健康会话"}
+_DETAIL_TIMEOUT = {"message": "工具调用超时"}
+_DETAIL_ALL_RETRIES_FAILED = {"message": "所有重试尝试都失败"}
+
+# 网络相关错误关键字，模块导入时编译为自动机
+_NETWORK_ERROR_MATCHER = KeywordMatcher(
+    (keyword, True)
+    for keyword in (
+        "connection", "network", "timeout",
+        "502", "503", "504", "524", "520", "521", "522", "523", "525",
+    )
+)
+
+# 可直接判定为网络问题的异常类型，命中时无需再扫描错误消息
+# （TimeoutError 属于 OSError，但在调用处单独处理）
+_NETWORK_EXCEPTIONS = (
+    OSError,
+    httpx.TransportError,
+    anyio.EndOfStream,
+    anyio.BrokenResourceError,
+    anyio.ClosedResourceError,
+)
+
+# 按重试次数索引的退避上限（秒）：指数退避，最大5秒
+_BACKOFF = (1, 2, 4, 5, 5)
+
+
+# mcpo.main 导入了本模块，首次使用时再解析并缓存模块引用（避免循环导入）
+_main_module = None
+
+
+def _get_default_connection_manager():
+    """获取 mcpo.main 中的全局连接管理器"""
+    global _main_module
+    if _main_module is None:
+        _main_module = importlib.import_module("mcpo.main")
+    return _main_module.connection_manager
+
+
+def _is_network_error(error_str: str) -> bool:
+    """判断（已转小写的）错误信息是否属于网络相关错误"""
+    return _NETWORK_ERROR_MATCHER.search(error_str)
+
+
+# JSON文本可能的首字符（含前导空白），其余文本不必交给JSON解析器
+_JSON_PREFIX = frozenset('{["-0123456789tfnNI \t\r\n')
+
+# orjson 会把超出64位的整数静默转成浮点数；含19位以上连续数字的文本交给标准库 json 以保留精确整数
+_LONG_DIGITS = re.compile(r"\d{19}")
+
+
+def _handle_text(content: types.TextContent) -> Any:
+    text = content.text
+    if isinstance(text, str) and text[:1] in _JSON_PREFIX:
+        if _LONG_DIGITS.search(text) is None:
+            try:
+                return orjson.loads(text)
+            except orjson.JSONDecodeError:
+                pass
+        # 标准库 json 还能解析 orjson 不支持的 NaN、Infinity 和溢出的浮点数
+        try:
+            text = json.loads(text)
+        except json.JSONDecodeError:
+            pass
+    return text
+
+
+def _handle_image(content: types.ImageContent) -> str:
+    # 图片以 data URI 字符串返回是对外的接口约定；响应序列化时负载总会被完整拷贝一次，
+    # 延迟拼接无法省掉这次拷贝，因此这里保持单次 f-string 拼接
+    return f"data:{content.mimeType};base64,{content.data}"
+
+
+def _handle_embedded(content: types.EmbeddedResource) -> str:
+    # TODO: Handle embedded resources
+    return "Embedded resource not supported yet."
+
+
+# 按内容类型分发处理函数，避免逐项的 isinstance 判断链
+_CONTENT_HANDLERS = {
+    types.TextContent: _handle_text,
+    types.ImageContent: _handle_image,
+    types.EmbeddedResource: _handle_embedded,
+}
+
 
 def process_tool_response(result: CallToolResult) -> list:
     """Universal response processor for all tool endpoints"""
     response = []
     for content in result.content:
-        if isinstance(content, types.TextContent):
-            text = content.text
-            if isinstance(text, str):
-                try:
-                    text = json.loads(text)
-                except json.JSONDecodeError:
-                    pass
-            response.append(text)
-        elif isinstance(content, types.ImageContent):
-            image_data = f"data:{content.mimeType};base64,{content.data}"
-            response.append(image_data)
-        elif isinstance(content, types.EmbeddedResource):
-            # TODO: Handle embedded resources
-            response.append("Embedded resource not supported yet.")
+        handler = _CONTENT_HANDLERS.get(type(content))
+        if handler is not None:
+            response.append(handler(content))
     return response
 
 
+class _CachedModelFields(dict):
+    """缓存的模型字段定义，同时记录由其生成的模型类"""
+
+    __slots__ = ("models",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.models: Dict[str, Type] = {}
+
+
+# 重连后重新注册工具时schema通常不变，按规范化schema的哈希复用生成结果
+_MODEL_CACHE: Dict[bytes, _CachedModelFields] = {}
+_SCHEMA_MODEL_CACHE: Dict[bytes, Type] = {}
+
+_NESTED_MODEL_CONFIG = ConfigDict(defer_build=True)
+
+
+def _schema_cache_key(name: str, *parts: Any) -> Optional[bytes]:
+    """按键排序后的JSON计算缓存键，无法序列化时返回None（不缓存）"""
+    try:
+        payload = orjson.dumps(parts, option=orjson.OPT_SORT_KEYS)
+    except TypeError:
+        return None
+    payload += name.encode()
+    if xxhash is not None:
+        return xxhash.xxh3_128_digest(payload)
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+
+def _create_model_cached(model_name: str, model_fields: Dict[str, Any]) -> Type:
+    """创建模型类，字段定义来自缓存时复用已生成的类"""
+    if isinstance(model_fields, _CachedModelFields):
+        model = model_fields.models.get(model_name)
+        if model is None:
+            model = create_model(model_name, **model_fields)
+            model_fields.models[model_name] = model
+        return model
+    return create_model(model_name, **model_fields)
+
+
+# 常见的可空标量联合类型，预先构建，schema 处理时直接查表
+_COMMON_UNIONS: Dict[tuple, Any] = {
+    **{(scalar, None): Optional[scalar] for scalar in (str, int, float, bool)},
+    **{(None, scalar): Optional[scalar] for scalar in (str, int, float, bool)},
+    (str, int): Union[str, int],
+    (int, float): Union[int, float],
+    (str, int, float): Union[str, int, float],
+}
+
+
+def _union_of(type_hints: List[Any]) -> Any:
+    """构建联合类型，常见组合直接复用预构建的结果"""
+    key = tuple(type_hints)
+    try:
+        common = _COMMON_UNIONS.get(key)
+    except TypeError:  # 含不可哈希的类型提示
+        common = None
+    return common if common is not None else Union[key]
+
+
 def _process_schema_property(
     _model_cache: Dict[str, Type],
     prop_schema: Dict[str, Any],
@@ -71,11 +224,13 @@ def _process_schema_property(
         A tuple containing (python_type_hint, pydantic_field).
         The pydantic_field contains default value and description.
     """
+    ref_key = None
     if "$ref" in prop_schema:
         ref = prop_schema["$ref"]
         ref = ref.split("/")[-1]
         assert ref in schema_defs, "Custom field not found"
         prop_schema = schema_defs[ref]
+        ref_key = f"$ref:{ref}"
 
     prop_type = prop_schema.get("type")
     prop_desc = prop_schema.get("description", "")
@@ -83,6 +238,10 @@ def _process_schema_property(
     default_value = ... if is_required else prop_schema.get("default", None)
     pydantic_field = Field(default=default_value, description=prop_desc)
 
+    # 同一 $ref 目标在一次生成中只构建一次模型，只复用类型，Field 按引用位置重新生成
+    if ref_key is not None and ref_key in _model_cache:
+        return _model_cache[ref_key], pydantic_field
+
     # Handle the case where prop_type is missing but 'anyOf' key exists
     # In this case, use data type from 'anyOf' to determine the type hint
     if "anyOf" in prop_schema:
@@ -96,7 +255,7 @@ def _process_schema_property(
                 False,
             )
             type_hints.append(type_hint)
-        return Union[tuple(type_hints)], pydantic_field
+        return _union_of(type_hints), pydantic_field
 
     # Handle the case where prop_type is a list of types, e.g. ['string', 'number']
     if isinstance(prop_type, list):
@@ -112,7 +271,7 @@ def _process_schema_property(
             type_hints.append(type_hint)
 
         # Return a Union of all possible types
-        return Union[tuple(type_hints)], pydantic_field
+        return _union_of(type_hints), pydantic_field
 
     if prop_type == "object":
         nested_properties = prop_schema.get("properties", {})
@@ -126,6 +285,16 @@ def _process_schema_property(
         if nested_model_name in _model_cache:
             return _model_cache[nested_model_name], pydantic_field
 
+        schema_key = _schema_cache_key(
+            nested_model_name, nested_properties, nested_required, schema_defs
+        )
+        cached_model = _SCHEMA_MODEL_CACHE.get(schema_key) if schema_key else None
+        if cached_model is not None:
+            _model_cache[nested_model_name] = cached_model
+            if ref_key is not None:
+                _model_cache[ref_key] = cached_model
+            return cached_model, pydantic_field
+
         for name, schema in nested_properties.items():
             is_nested_required = name in nested_required
             nested_type_hint, nested_pydantic_field = _process_schema_property(
@@ -142,8 +311,15 @@ def _process_schema_property(
         if not nested_fields:
             return Dict[str, Any], pydantic_field
 
-        NestedModel = create_model(nested_model_name, **nested_fields)
+        # 嵌套模型延迟构建：其核心schema在外层模型构建时一并生成，不再单独编译一次
+        NestedModel = create_model(
+            nested_model_name, __config__=_NESTED_MODEL_CONFIG, **nested_fields
+        )
         _model_cache[nested_model_name] = NestedModel
+        if ref_key is not None:
+            _model_cache[ref_key] = NestedModel
+        if schema_key:
+            _SCHEMA_MODEL_CACHE[schema_key] = NestedModel
 
         return NestedModel, pydantic_field
 
@@ -180,7 +356,17 @@ def _process_schema_property(
 
 
 def get_model_fields(form_model_name, properties, required_fields, schema_defs=None):
-    model_fields = {}
+    """
+    根据JSON Schema生成模型字段定义
+    相同输入返回同一个缓存对象，调用方不应修改返回值
+    """
+    key = _schema_cache_key(form_model_name, properties, required_fields, schema_defs)
+    if key is not None:
+        cached = _MODEL_CACHE.get(key)
+        if cached is not None:
+            return cached
+
+    model_fields = _CachedModelFields()
 
     _model_cache: Dict[str, Type] = {}
 
@@ -196,9 +382,28 @@ def get_model_fields(form_model_name, properties, required_fields, schema_defs=N
         )
         # Use the generated type hint and Field info
         model_fields[param_name] = (python_type_hint, pydantic_field_info)
+
+    if key is not None:
+        _MODEL_CACHE[key] = model_fields
     return model_fields
 
 
+def _contains_model(annotation: Any) -> bool:
+    """类型提示中是否包含嵌套的 Pydantic 模型"""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return True
+    return any(_contains_model(arg) for arg in get_args(annotation))
+
+
+def _dump_set_fields(form_data: BaseModel) -> Dict[str, Any]:
+    """只读取调用方提供且非None的字段，跳过 model_dump 的序列化器（仅用于不含嵌套模型的表单）"""
+    return {
+        name: value
+        for name in form_data.__pydantic_fields_set__
+        if (value := getattr(form_data, name)) is not None
+    }
+
+
 def get_tool_handler(
     session,
     endpoint_name,
@@ -207,61 +412,93 @@ def get_tool_handler(
     connection_name: str = "Unknown",
     connection_manager=None
 ):
+    # 处理函数持有的会话及预绑定的 call_tool，重连后由 _execute_tool_request 更新
+    session_state = _new_session_state(session)
+
     if form_model_fields:
-        FormModel = create_model(f"{endpoint_name}_form_model", **form_model_fields)
+        FormModel = _create_model_cached(f"{endpoint_name}_form_model", form_model_fields)
         ResponseModel = (
-            create_model(f"{endpoint_name}_response_model", **response_model_fields)
+            _create_model_cached(f"{endpoint_name}_response_model", response_model_fields)
             if response_model_fields
             else Any
         )
 
+        # 不含嵌套模型的表单可以直接读取属性，嵌套模型仍需 model_dump 转换为字典
+        flat_form = not any(
+            _contains_model(field.annotation) for field in FormModel.model_fields.values()
+        )
+
         def make_endpoint_func(
-            endpoint_name: str, FormModel, session: ClientSession
+            endpoint_name: str, FormModel, session_state: Dict[str, Any]
         ):  # Parameterized endpoint
             async def tool(form_data: FormModel) -> ResponseModel:
-                args = form_data.model_dump(exclude_none=True)
+                # 只导出调用方实际提供的字段，未设置的默认值交给MCP服务器处理
+                if flat_form:
+                    args = _dump_set_fields(form_data)
+                else:
+                    args = form_data.model_dump(exclude_unset=True, exclude_none=True)
 
                 # 直接执行工具请求，专注于网络错误处理
                 return await _execute_tool_request(
-                    endpoint_name, args, session, connection_name, connection_manager
+                    endpoint_name, args, session_state["session"], connection_name,
+                    connection_manager, session_state
                 )
 
             return tool
 
-        tool_handler = make_endpoint_func(endpoint_name, FormModel, session)
+        tool_handler = make_endpoint_func(endpoint_name, FormModel, session_state)
     else:
 
         def make_endpoint_func_no_args(
-            endpoint_name: str, session: ClientSession
+            endpoint_name: str, session_state: Dict[str, Any]
         ):  # Parameterless endpoint
             async def tool():  # No parameters
                 # 直接执行工具请求，专注于网络错误处理
                 return await _execute_tool_request(
-                    endpoint_name, {}, session, connection_name, connection_manager
+                    endpoint_name, _EMPTY_ARGS, session_state["session"], connection_name,
+                    connection_manager, session_state
                 )
 
             return tool
 
-        tool_handler = make_endpoint_func_no_args(endpoint_name, session)
+        tool_handler = make_endpoint_func_no_args(endpoint_name, session_state)
 
     return tool_handler
 
 
+def _new_session_state(session: Optional[ClientSession]) -> Dict[str, Any]:
+    """创建会话状态，缓存绑定好的 session.call_tool"""
+    return {"session": session, "call_tool": session.call_tool if session else None}
+
+
+def _bind_session(session_state: Optional[Dict[str, Any]], session: Optional[ClientSession]):
+    """切换到新会话并返回其 call_tool；处理函数的后续调用直接使用新会话"""
+    if session_state is None or not session:
+        return session.call_tool if session else None
+    session_state.update(_new_session_state(session))
+    return session_state["call_tool"]
+
+
 async def _execute_tool_request(
     endpoint_name: str,
     args: Dict[str, Any],
     session: ClientSession,
     connection_name: str,
-    connection_manager=None
+    connection_manager=None,
+    session_state: Optional[Dict[str, Any]] = None
 ) -> Any:
     """执行工具请求的核心逻辑，专注于网络错误处理和防卡死"""
     logger.debug(f"开始执行工具请求: {endpoint_name}, 连接: {connection_name}")
 
-    # 使用传入的连接管理器，如果没有则导入全局的（避免循环导入）
+    # 使用传入的连接管理器，如果没有则使用全局的
     if connection_manager is None:
-        from mcpo.main import connection_manager as global_connection_manager
-        connection_manager = global_connection_manager
-    from mcpo.utils.reconnect_manager import reconnect_manager, handle_connection_error
+        connection_manager = _get_default_connection_manager()
+    reconnect_manager = _reconnect.reconnect_manager
+
+    if session_state is not None and session_state["session"] is session:
+        call_tool = session_state["call_tool"]
+    else:
+        call_tool = session.call_tool if session else None
 
     max_retries = 3  # 最多重试3次
     base_timeout = 30.0  # 基础超时时间
@@ -272,22 +509,18 @@ async def _execute_tool_request(
             if not session:
                 logger.warning(f"会话为空，尝试获取新会话: {connection_name}")
                 session = await reconnect_manager.get_healthy_session(connection_name)
+                call_tool = _bind_session(session_state, session)
                 if not session:
-                    raise HTTPException(
-                        status_code=503,
-                        detail={"message": "MCP服务器连接不可用", "error": "无法获取健康会话"}
-                    )
+                    raise HTTPException(status_code=503, detail=_DETAIL_NO_SESSION)
 
             # 动态调整超时时间（重试时增加超时）
             current_timeout = base_timeout + (attempt * 10)  # 每次重试增加10秒
 
             logger.debug(f"调用工具 {endpoint_name} (尝试 {attempt + 1}/{max_retries + 1}, 超时: {current_timeout}s)")
 
-            # 使用超时保护执行工具调用
-            result = await asyncio.wait_for(
-                session.call_tool(endpoint_name, arguments=args),
-                timeout=current_timeout
-            )
+            # 使用超时保护执行工具调用（asyncio.timeout 直接作用于当前任务，无需额外创建Task）
+            async with asyncio.timeout(current_timeout):
+                result = await call_tool(endpoint_name, args)
 
             # 检查工具执行结果
             if result.isError:
@@ -305,8 +538,9 @@ async def _execute_tool_request(
                     detail={"message": error_message}
                 )
 
-            # 记录成功调用
+            # 记录成功调用，重连管理器据此跳过紧随其后的健康探测
             connection_manager.record_connection_success(connection_name)
+            reconnect_manager.mark_healthy(connection_name)
             logger.debug(f"工具调用成功: {endpoint_name}")
 
             response_data = process_tool_response(result)
@@ -315,11 +549,13 @@ async def _execute_tool_request(
         except HTTPException:
             # HTTPException直接抛出，不重试
             raise
-        except asyncio.TimeoutError:
+        except TimeoutError:
             # 超时错误，记录并尝试重连
             timeout_error = f"工具调用超时 ({current_timeout}秒): {endpoint_name}"
             logger.warning(f"{timeout_error} (尝试 {attempt + 1}/{max_retries + 1})")
             connection_manager.record_connection_error(connection_name, timeout_error)
+            # 调用失败后不再信任之前的健康标记，获取会话时重新探测
+            reconnect_manager.mark_unhealthy(connection_name)
 
             if attempt < max_retries:
                 logger.info(f"超时后尝试重连并重试: {endpoint_name}")
@@ -327,57 +563,57 @@ async def _execute_tool_request(
                 success = await reconnect_manager.attempt_reconnect(connection_name)
                 if success:
                     session = await reconnect_manager.get_healthy_session(connection_name)
+                    call_tool = _bind_session(session_state, session)
                     continue
                 else:
                     logger.warning(f"重连失败: {connection_name}")
 
             # 最后一次尝试失败
             raise HTTPException(
-                status_code=504,
-                detail={"message": "工具调用超时", "error": timeout_error}
+                status_code=504, detail={**_DETAIL_TIMEOUT, "error": timeout_error}
             )
         except Exception as e:
-            error_str = str(e).lower()
-            logger.warning(f"工具调用异常 {endpoint_name}: {str(e)} (尝试 {attempt + 1}/{max_retries + 1})")
-            connection_manager.record_connection_error(connection_name, str(e))
-
-            # 检查是否是网络相关错误
-            network_errors = ["connection", "network", "timeout", "502", "503", "504", "524", "520", "521", "522", "523", "525"]
-            is_network_error = any(keyword in error_str for keyword in network_errors)
+            error_text = str(e)
+            logger.warning(f"工具调用异常 {endpoint_name}: {error_text} (尝试 {attempt + 1}/{max_retries + 1})")
+            connection_manager.record_connection_error(connection_name, error_text)
+            reconnect_manager.mark_unhealthy(connection_name)
+
+            # 检查是否是网络相关错误：先按异常类型判断，未知类型再扫描错误消息
+            is_network_error = isinstance(e, _NETWORK_EXCEPTIONS) or _is_network_error(
+                error_text.lower()
+            )
 
             if is_network_error and attempt < max_retries:
                 logger.info(f"检测到网络错误，尝试重连: {endpoint_name}")
-                # 等待一段时间后重试
-                await asyncio.sleep(min(2 ** attempt, 5))  # 指数退避，最大5秒
+                # 全抖动退避，避免并发请求同时重试同一个故障后端
+                await asyncio.sleep(random.uniform(0, _BACKOFF[attempt]))
 
                 # 尝试重连
                 success = await reconnect_manager.attempt_reconnect(connection_name)
                 if success:
                     session = await reconnect_manager.get_healthy_session(connection_name)
+                    call_tool = _bind_session(session_state, session)
                     continue
                 else:
                     logger.warning(f"重连失败: {connection_name}")
 
             # 最后一次尝试失败
             if attempt == max_retries:
-                logger.error(f"工具调用 {endpoint_name} 最终失败: {str(e)}")
+                logger.error(f"工具调用 {endpoint_name} 最终失败: {error_text}")
 
                 if is_network_error:
                     raise HTTPException(
                         status_code=503,
-                        detail={"message": f"MCP服务器连接问题: {str(e)}"}
+                        detail={"message": f"MCP服务器连接问题: {error_text}"}
                     )
                 else:
                     raise HTTPException(
                         status_code=500,
-                        detail={"message": f"工具执行失败: {str(e)}"}
+                        detail={"message": f"工具执行失败: {error_text}"}
                     )
 
     # 如果所有重试都失败，这里不应该到达
-    raise HTTPException(
-        status_code=500,
-        detail={"message": "所有重试尝试都失败"}
-    )
+    raise HTTPException(status_code=500, detail=_DETAIL_ALL_RETRIES_FAILED)
 
 
 # 删除了复杂的辅助函数，保持代码简洁
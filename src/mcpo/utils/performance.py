@@ -4,14 +4,24 @@
 """
 
 import asyncio
+import hashlib
+import json
 import time
 import logging
 from typing import Any, Dict, List, Optional, Callable, Tuple, Set
 from dataclasses import dataclass, field
-from collections import defaultdict, deque
+from array import array
+from collections import OrderedDict, defaultdict
 from contextlib import asynccontextmanager
 import weakref
 
+import orjson
+
+try:
+    import xxhash  # 可选依赖，非加密哈希，速度远高于hashlib
+except ImportError:
+    xxhash = None
+
 logger = logging.getLogger(__name__)
 
 
@@ -49,30 +59,25 @@ class ConcurrencyLimiter:
     
     def __init__(self, max_concurrent: int = 100):
         self.max_concurrent = max_concurrent
-        self._semaphore = asyncio.Semaphore(max_concurrent)
-        self._current_count = 0
+        self._semaphore = asyncio.BoundedSemaphore(max_concurrent)
         self._peak_count = 0
-        self._lock = asyncio.Lock()
     
     @asynccontextmanager
     async def acquire(self):
         """获取并发许可"""
         async with self._semaphore:
-            async with self._lock:
-                self._current_count += 1
-                self._peak_count = max(self._peak_count, self._current_count)
-            
-            try:
-                yield
-            finally:
-                async with self._lock:
-                    self._current_count -= 1
+            # 峰值更新之间没有await，在单线程事件循环中天然原子，无需加锁
+            current = self.max_concurrent - self._semaphore._value
+            if current > self._peak_count:
+                self._peak_count = current
+            yield
     
     def get_stats(self) -> Dict[str, int]:
         """获取并发统计"""
         return {
             'max_concurrent': self.max_concurrent,
-            'current_concurrent': self._current_count,
+            # 当前并发数直接由信号量剩余许可推算
+            'current_concurrent': self.max_concurrent - self._semaphore._value,
             'peak_concurrent': self._peak_count,
         }
 
@@ -80,29 +85,33 @@ class ConcurrencyLimiter:
 class RequestDeduplicator:
     """请求去重器"""
     
-    def __init__(self, ttl: float = 60.0):
-        self.ttl = ttl
-        self._pending_requests: Dict[str, asyncio.Future] = {}
+    def __init__(self, ttl: float = 60.0, max_pending: int = 1000):
+        self.ttl = ttl  # 保留以兼容旧的调用方式，清理已改为在请求完成时进行
+        self.max_pending = max_pending
+        # 请求完成时即从表中移除，表的大小等于进行中的去重请求数
+        self._pending_requests: "OrderedDict[str, asyncio.Future]" = OrderedDict()
         self._lock = None  # 延迟初始化
-
-        # 清理任务（延迟初始化）
-        self._cleanup_task = None
         self._initialized = False
 
     async def _ensure_initialized(self):
         """确保去重器已初始化"""
         if not self._initialized:
             self._lock = asyncio.Lock()
-            self._cleanup_task = asyncio.create_task(self._periodic_cleanup())
             self._initialized = True
     
     def _generate_key(self, endpoint: str, args: Dict[str, Any]) -> str:
-        """生成请求键"""
-        import hashlib
-        import json
+        """生成请求键（键只用于进程内去重，无需加密哈希）"""
         key_data = {'endpoint': endpoint, 'args': args}
-        key_str = json.dumps(key_data, sort_keys=True, ensure_ascii=False)
-        return hashlib.md5(key_str.encode()).hexdigest()
+        try:
+            key_bytes = orjson.dumps(
+                key_data, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+            )
+        except TypeError:
+            # orjson 不支持的值（如超过64位的整数），退回标准库 json
+            key_bytes = json.dumps(key_data, sort_keys=True, ensure_ascii=False).encode()
+        if xxhash is not None:
+            return xxhash.xxh3_64_hexdigest(key_bytes)
+        return hashlib.blake2b(key_bytes, digest_size=8).hexdigest()
     
     async def execute_or_wait(self,
                              endpoint: str,
@@ -112,33 +121,29 @@ class RequestDeduplicator:
         await self._ensure_initialized()
         key = self._generate_key(endpoint, args)
 
-        # 检查是否有待处理的请求
+        # 在同一次加锁中取得或创建任务，只有创建者启动执行器
         async with self._lock:
-            if key in self._pending_requests:
-                # 获取已有的future
-                existing_future = self._pending_requests[key]
+            future = self._pending_requests.get(key)
+            if future is None:
+                future = asyncio.create_task(self._execute_with_cleanup(key, executor))
+                self._register_pending(key, future)
+            else:
                 logger.debug(f"等待重复请求完成: {endpoint}")
 
-        # 如果有已存在的请求，等待它完成
-        if 'existing_future' in locals():
-            try:
-                return await existing_future
-            except Exception as e:
-                # 如果等待的请求失败，继续创建新请求
-                logger.debug(f"等待的请求失败，重新执行: {endpoint}")
-
-        # 创建新请求
-        async with self._lock:
-            # 再次检查，防止竞态条件
-            if key in self._pending_requests:
-                return await self._pending_requests[key]
-
-            # 创建新的任务
-            future = asyncio.create_task(self._execute_with_cleanup(key, executor))
-            self._pending_requests[key] = future
-
-        # 在锁外等待任务完成
-        return await future
+        # 在锁外等待任务完成，结果或异常由所有调用方共享；
+        # shield 避免某个调用方被取消时连带取消其他调用方共享的任务
+        return await asyncio.shield(future)
+    
+    def _register_pending(self, key: str, future: asyncio.Future):
+        """登记进行中的请求；超过上限时先淘汰最旧的已结束请求，仍然超限则不参与去重"""
+        pending = self._pending_requests
+        while len(pending) >= self.max_pending:
+            oldest_key, oldest = next(iter(pending.items()))
+            if not oldest.done():
+                logger.debug("待处理请求数达到上限，本次请求不参与去重")
+                return
+            del pending[oldest_key]
+        pending[key] = future
     
     async def _execute_with_cleanup(self, key: str, executor: Callable) -> Any:
         """执行请求并清理"""
@@ -147,41 +152,14 @@ class RequestDeduplicator:
             return result
         finally:
             async with self._lock:
-                if key in self._pending_requests:
+                # 只移除自己登记的任务（未登记时同一个键可能属于其他请求）
+                if self._pending_requests.get(key) is asyncio.current_task():
                     del self._pending_requests[key]
     
-    async def _periodic_cleanup(self):
-        """定期清理过期请求，增强错误处理"""
-        while True:
-            try:
-                await asyncio.sleep(self.ttl)
-                async with self._lock:
-                    # 清理已完成的请求
-                    completed_keys = [
-                        key for key, future in self._pending_requests.items()
-                        if future.done()
-                    ]
-                    for key in completed_keys:
-                        del self._pending_requests[key]
-            except asyncio.CancelledError:
-                logger.info("请求去重清理任务被取消")
-                break
-            except Exception as e:
-                logger.error(f"请求去重清理时出错: {e}")
-                # 短暂等待后继续，避免快速循环
-                try:
-                    await asyncio.sleep(5)
-                except asyncio.CancelledError:
-                    break
-    
     async def close(self):
         """关闭去重器，确保资源正确释放"""
-        if self._cleanup_task and not self._cleanup_task.done():
-            self._cleanup_task.cancel()
-            try:
-                await asyncio.wait_for(self._cleanup_task, timeout=3.0)
-            except (asyncio.CancelledError, asyncio.TimeoutError):
-                pass
+        if not self._initialized:
+            return
 
         # 取消所有待处理的请求
         async with self._lock:
@@ -204,6 +182,7 @@ class BatchProcessor:
         
         self._batches: Dict[str, List[Tuple[Dict[str, Any], asyncio.Future]]] = defaultdict(list)
         self._batch_timers: Dict[str, asyncio.Task] = {}
+        self._running: Set[asyncio.Task] = set()  # 持有执行中任务的引用，防止被回收
         self._lock = asyncio.Lock()
     
     async def add_request(self, 
@@ -211,14 +190,14 @@ class BatchProcessor:
                          args: Dict[str, Any],
                          executor: Callable) -> Any:
         """添加请求到批处理队列"""
-        future = asyncio.Future()
+        future = asyncio.get_running_loop().create_future()
         
         async with self._lock:
             self._batches[endpoint].append((args, future))
             
             # 如果达到批处理大小，立即处理
             if len(self._batches[endpoint]) >= self.batch_size:
-                await self._process_batch(endpoint, executor)
+                self._process_batch(endpoint, executor)
             else:
                 # 设置定时器
                 if endpoint not in self._batch_timers:
@@ -233,13 +212,16 @@ class BatchProcessor:
         try:
             await asyncio.sleep(self.batch_timeout)
             async with self._lock:
+                # 先移除自身，避免 _process_batch 取消正在运行的定时器
+                if self._batch_timers.get(endpoint) is asyncio.current_task():
+                    del self._batch_timers[endpoint]
                 if endpoint in self._batches and self._batches[endpoint]:
-                    await self._process_batch(endpoint, executor)
+                    self._process_batch(endpoint, executor)
         except asyncio.CancelledError:
             pass
     
-    async def _process_batch(self, endpoint: str, executor: Callable):
-        """处理批次"""
+    def _process_batch(self, endpoint: str, executor: Callable):
+        """处理批次（调用方持有锁）：只启动执行任务，不在锁内等待其完成"""
         if endpoint not in self._batches or not self._batches[endpoint]:
             return
         
@@ -247,19 +229,17 @@ class BatchProcessor:
         self._batches[endpoint] = []
         
         # 取消定时器
-        if endpoint in self._batch_timers:
-            self._batch_timers[endpoint].cancel()
-            del self._batch_timers[endpoint]
+        timer = self._batch_timers.pop(endpoint, None)
+        if timer is not None:
+            timer.cancel()
         
         logger.debug(f"处理批次: {endpoint}, 大小: {len(batch)}")
         
-        # 并发执行批次中的所有请求
-        tasks = []
+        # 并发执行批次中的所有请求，结果通过各自的future返回
         for args, future in batch:
             task = asyncio.create_task(self._execute_single(executor, args, future))
-            tasks.append(task)
-        
-        await asyncio.gather(*tasks, return_exceptions=True)
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
     
     async def _execute_single(self, executor: Callable, args: Dict[str, Any], future: asyncio.Future):
         """执行单个请求"""
@@ -272,27 +252,78 @@ class BatchProcessor:
                 future.set_exception(e)
 
 
+_NS_PER_SECOND = 1_000_000_000
+
+
+class _RequestWindow:
+    """
+    最近请求的环形缓冲区
+    用三个定长的 array 分别保存时间戳（perf_counter_ns）、耗时（秒）和成功标记，
+    避免每条记录一个字典
+    """
+
+    __slots__ = ("size", "timestamps", "durations", "successes", "head", "count")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.timestamps = array('q', bytes(8 * size))
+        self.durations = array('f', bytes(4 * size))
+        self.successes = array('b', bytes(size))
+        self.head = 0  # 下一条记录的写入位置
+        self.count = 0
+
+    def append(self, timestamp: int, duration: float, success: bool):
+        """写入一条记录，写满后覆盖最旧的记录"""
+        head = self.head
+        self.timestamps[head] = timestamp
+        self.durations[head] = duration
+        self.successes[head] = success
+        self.head = head + 1 if head + 1 < self.size else 0
+        if self.count < self.size:
+            self.count += 1
+
+    def count_since(self, recent_cutoff: int, window_cutoff: int) -> Tuple[int, int]:
+        """
+        一次扫描分别统计时间戳不早于 recent_cutoff 和 window_cutoff 的记录数
+        （recent_cutoff >= window_cutoff）。记录按时间顺序写入，从最新记录向前扫描，
+        遇到早于 window_cutoff 的记录即停止
+        """
+        timestamps = self.timestamps
+        index = self.head
+        matched = 0
+        recent = -1
+        for _ in range(self.count):
+            index = index - 1 if index else self.size - 1
+            timestamp = timestamps[index]
+            if timestamp < window_cutoff:
+                break
+            if recent < 0 and timestamp < recent_cutoff:
+                recent = matched
+            matched += 1
+        return (matched if recent < 0 else recent), matched
+
+
 class PerformanceMonitor:
     """性能监控器"""
     
     def __init__(self, window_size: int = 1000):
         self.window_size = window_size
         self._metrics: Dict[str, PerformanceMetrics] = defaultdict(PerformanceMetrics)
-        self._recent_requests: Dict[str, deque] = defaultdict(lambda: deque(maxlen=window_size))
-        self._lock = asyncio.Lock()
+        self._recent_requests: Dict[str, _RequestWindow] = defaultdict(
+            lambda: _RequestWindow(window_size)
+        )
     
     @asynccontextmanager
     async def monitor_request(self, endpoint: str):
         """监控请求性能"""
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         success = True
         
-        async with self._lock:
-            self._metrics[endpoint].concurrent_requests += 1
-            self._metrics[endpoint].peak_concurrent = max(
-                self._metrics[endpoint].peak_concurrent,
-                self._metrics[endpoint].concurrent_requests
-            )
+        # 统计更新之间没有await，无需加锁
+        metrics = self._metrics[endpoint]
+        metrics.concurrent_requests += 1
+        if metrics.concurrent_requests > metrics.peak_concurrent:
+            metrics.peak_concurrent = metrics.concurrent_requests
         
         try:
             yield
@@ -300,28 +331,24 @@ class PerformanceMonitor:
             success = False
             raise
         finally:
-            end_time = time.time()
-            duration = end_time - start_time
+            end_ns = time.perf_counter_ns()
+            duration = (end_ns - start_ns) / _NS_PER_SECOND
             
-            async with self._lock:
-                self._metrics[endpoint].concurrent_requests -= 1
-                self._metrics[endpoint].add_request(duration, success)
-                self._recent_requests[endpoint].append({
-                    'timestamp': end_time,
-                    'duration': duration,
-                    'success': success
-                })
+            metrics.concurrent_requests -= 1
+            metrics.add_request(duration, success)
+            self._recent_requests[endpoint].append(end_ns, duration, success)
     
     def get_metrics(self, endpoint: str = None) -> Dict[str, Any]:
         """获取性能指标"""
         if endpoint:
             metrics = self._metrics[endpoint]
-            recent = list(self._recent_requests[endpoint])
+            recent = self._recent_requests[endpoint]
             
             # 计算最近的QPS
-            now = time.time()
-            recent_1s = [r for r in recent if now - r['timestamp'] <= 1.0]
-            recent_5s = [r for r in recent if now - r['timestamp'] <= 5.0]
+            now_ns = time.perf_counter_ns()
+            recent_1s, recent_5s = recent.count_since(
+                now_ns - _NS_PER_SECOND, now_ns - 5 * _NS_PER_SECOND
+            )
             
             return {
                 'endpoint': endpoint,
@@ -332,8 +359,8 @@ class PerformanceMonitor:
                 'success_rate': round(metrics.get_success_rate(), 2),
                 'current_concurrent': metrics.concurrent_requests,
                 'peak_concurrent': metrics.peak_concurrent,
-                'qps_1s': len(recent_1s),
-                'qps_5s': len(recent_5s) / 5.0,
+                'qps_1s': recent_1s,
+                'qps_5s': recent_5s / 5.0,
             }
         else:
             return {endpoint: self.get_metrics(endpoint) for endpoint in self._metrics.keys()}
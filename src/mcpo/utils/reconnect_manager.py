@@ -5,17 +5,37 @@
 
 import asyncio
 import logging
+import random
 import time
-from typing import Dict, Optional, Callable, Any
+from typing import Dict, Mapping, Optional, Callable, Any
 from contextlib import asynccontextmanager
+from types import MappingProxyType
 
 from mcp import ClientSession
 from mcp.client.streamable_http import streamablehttp_client
 from mcp.client.stdio import stdio_client
 from mcp.client.sse import sse_client
 
+from .keyword_matcher import KeywordMatcher
+
 logger = logging.getLogger(__name__)
 
+# 确认健康后的这段时间内（秒）跳过 list_tools 探测；
+# 任何失败（record_error，或工具调用失败时的 mark_unhealthy）都会立即作废该期限
+_HEALTHY_TTL = 5.0
+
+# validate_all_connections 同时进行的健康探测上限
+_MAX_CONCURRENT_PROBES = 16
+
+# 重连退避：指数增长，上限30秒，并叠加最多50%的随机抖动，避免大量连接同时重试
+_MAX_BACKOFF = 30.0
+_JITTER = 0.5
+
+
+def _backoff_delay(attempt: int) -> float:
+    """第 attempt 次失败后的等待时间（秒）"""
+    return min(_MAX_BACKOFF, 2 ** attempt) * (1 + random.random() * _JITTER)
+
 
 class ReconnectManager:
     """
@@ -29,6 +49,8 @@ class ReconnectManager:
         self.reconnect_locks: Dict[str, asyncio.Lock] = {}
         self.connection_status: Dict[str, Dict[str, Any]] = {}
         self.apps: Dict[str, Any] = {}
+        self._probe_sem = asyncio.Semaphore(_MAX_CONCURRENT_PROBES)
+        self._connection_count = 0  # 已注册连接数，随注册/注销维护
         
     def register_connection(self, 
                           name: str, 
@@ -37,6 +59,8 @@ class ReconnectManager:
                           config: Dict[str, Any],
                           app: Any = None):
         """注册连接和重连信息"""
+        if name not in self.connections:
+            self._connection_count += 1
         self.connections[name] = session
         self.connection_factories[name] = connection_factory
         self.connection_configs[name] = config
@@ -47,7 +71,9 @@ class ReconnectManager:
             "error_count": 0,
             "reconnect_attempts": 0,
             "last_check": time.time(),
-            "last_reconnect": 0
+            "last_reconnect": 0,  # 墙钟时间，仅用于展示
+            "last_reconnect_mono": None,  # monotonic 时间，用于重连间隔判断
+            "healthy_until": 0.0,  # monotonic 时间，在此之前无需再次探测
         }
         if app:
             self.apps[name] = app
@@ -55,6 +81,8 @@ class ReconnectManager:
     
     def unregister_connection(self, name: str):
         """注销连接"""
+        if name in self.connections:
+            self._connection_count -= 1
         for dict_obj in [self.connections, self.connection_factories, 
                         self.connection_configs, self.reconnect_locks,
                         self.connection_status, self.apps]:
@@ -69,6 +97,7 @@ class ReconnectManager:
             status["last_error"] = error
             status["status"] = "error"
             status["last_check"] = time.time()
+            status["healthy_until"] = 0.0  # 出错后下一次获取会话时重新探测
             logger.warning(f"连接 {name} 错误: {error} (错误次数: {status['error_count']})")
     
     def record_success(self, name: str):
@@ -81,8 +110,21 @@ class ReconnectManager:
                 "status": "healthy",
                 "error_count": 0,
                 "last_error": None,
-                "last_check": time.time()
+                "last_check": time.time(),
+                "healthy_until": time.monotonic() + _HEALTHY_TTL,
             })
+
+    def mark_healthy(self, name: str):
+        """工具调用成功时标记会话健康，短时间内的健康检查可直接跳过"""
+        status = self.connection_status.get(name)
+        if status is not None:
+            status["healthy_until"] = time.monotonic() + _HEALTHY_TTL
+
+    def mark_unhealthy(self, name: str):
+        """工具调用失败时作废健康缓存，下一次获取会话时重新探测"""
+        status = self.connection_status.get(name)
+        if status is not None:
+            status["healthy_until"] = 0.0
     
     def should_reconnect(self, name: str) -> bool:
         """判断是否应该尝试重连"""
@@ -90,10 +132,10 @@ class ReconnectManager:
             return False
             
         status = self.connection_status[name]
-        current_time = time.time()
         
-        # 检查重连频率限制（最少间隔30秒）
-        if current_time - status.get("last_reconnect", 0) < 30:
+        # 检查重连频率限制（最少间隔30秒，使用monotonic时间，不受系统时钟调整影响）
+        last_reconnect = status.get("last_reconnect_mono")
+        if last_reconnect is not None and time.monotonic() - last_reconnect < 30:
             return False
             
         # 检查重连次数限制
@@ -112,6 +154,10 @@ class ReconnectManager:
             logger.warning(f"连接 {name} 未在重连管理器中注册，无法自动重连")
             return False
         
+        # 已恢复健康时无需排队等锁（锁内仍会再次检查）
+        if self.connection_status[name]["status"] == "healthy":
+            return True
+
         # 使用锁防止并发重连
         async with self.reconnect_locks[name]:
             # 再次检查是否需要重连（可能其他协程已经重连成功）
@@ -124,6 +170,7 @@ class ReconnectManager:
             status = self.connection_status[name]
             status["reconnect_attempts"] += 1
             status["last_reconnect"] = time.time()
+            status["last_reconnect_mono"] = time.monotonic()
             
             try:
                 # 获取连接工厂和配置
@@ -181,7 +228,7 @@ class ReconnectManager:
                 logger.warning(f"连接 {name} 失败 (尝试 {attempt + 1}/{max_attempts}): {str(e)}")
 
             if attempt < max_attempts - 1:
-                await asyncio.sleep(2 ** attempt)  # 指数退避
+                await asyncio.sleep(_backoff_delay(attempt))  # 指数退避
 
         raise last_exception
     
@@ -192,15 +239,22 @@ class ReconnectManager:
 
         session = self.connections[name]
 
-        # 先进行实时健康检查，统一使用3秒超时
+        # 刚确认过健康（成功调用、探测或重连）时不再重复探测
+        status = self.connection_status.get(name)
+        if status is not None and time.monotonic() < status.get("healthy_until", 0.0):
+            return session
+
+        # 先进行实时健康检查，统一使用3秒超时（asyncio.timeout 不额外创建Task）
         try:
-            await asyncio.wait_for(session.list_tools(), timeout=3.0)
+            async with asyncio.timeout(3.0):
+                await session.list_tools()
             # 更新健康状态
             if name in self.connection_status:
                 self.connection_status[name].update({
                     "status": "healthy",
                     "last_check": time.time(),
-                    "last_error": None
+                    "last_error": None,
+                    "healthy_until": time.monotonic() + _HEALTHY_TTL,
                 })
             return session
         except asyncio.TimeoutError:
@@ -227,14 +281,16 @@ class ReconnectManager:
         try:
             session = self.connections[name]
             # 执行健康检查
-            await asyncio.wait_for(session.list_tools(), timeout=3.0)
+            async with asyncio.timeout(3.0):
+                await session.list_tools()
 
             # 更新状态
             if name in self.connection_status:
                 self.connection_status[name].update({
                     "status": "healthy",
                     "last_check": time.time(),
-                    "last_error": None
+                    "last_error": None,
+                    "healthy_until": time.monotonic() + _HEALTHY_TTL,
                 })
 
             logger.debug(f"连接状态刷新成功: {name}")
@@ -246,15 +302,26 @@ class ReconnectManager:
             return False
 
     async def validate_all_connections(self) -> Dict[str, bool]:
-        """验证所有连接的健康状态"""
+        """验证所有连接的健康状态（各连接的探测并发进行）"""
+        names = tuple(self.connections)
+
+        async def probe(name: str) -> bool:
+            # 限制同时进行的探测数量，避免大量连接同时冲击共享的上游
+            async with self._probe_sem:
+                return await self.refresh_connection_state(name)
+
+        outcomes = await asyncio.gather(
+            *(probe(name) for name in names),
+            return_exceptions=True,
+        )
+
         results = {}
-        for name in list(self.connections.keys()):
-            try:
-                is_healthy = await self.refresh_connection_state(name)
-                results[name] = is_healthy
-            except Exception as e:
-                logger.error(f"验证连接 {name} 时发生异常: {str(e)}")
+        for name, outcome in zip(names, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(f"验证连接 {name} 时发生异常: {str(outcome)}")
                 results[name] = False
+            else:
+                results[name] = outcome
 
         return results
     
@@ -262,9 +329,13 @@ class ReconnectManager:
         """获取连接状态"""
         return self.connection_status.get(name, {"status": "unknown"})
     
-    def get_all_status(self) -> Dict[str, Dict[str, Any]]:
-        """获取所有连接状态"""
-        return self.connection_status.copy()
+    def get_all_status(self) -> Mapping[str, Dict[str, Any]]:
+        """获取所有连接状态的只读视图（不复制；需要修改或长期保存时使用 snapshot_status）"""
+        return MappingProxyType(self.connection_status)
+
+    def snapshot_status(self) -> Dict[str, Dict[str, Any]]:
+        """获取所有连接状态的副本，每个连接的状态字典也会复制"""
+        return {name: dict(status) for name, status in self.connection_status.items()}
 
 
 # 全局重连管理器
@@ -313,23 +384,18 @@ async def resilient_streamable_connection(url: str, headers: Dict[str, str] = No
             logger.warning(f"连接 {url} 失败 (尝试 {attempt + 1}/{max_attempts}): {str(e)}")
 
             if attempt < max_attempts - 1:
-                wait_time = 2 ** attempt
-                logger.info(f"等待 {wait_time} 秒后重试...")
+                wait_time = _backoff_delay(attempt)
+                logger.info(f"等待 {wait_time:.1f} 秒后重试...")
                 await asyncio.sleep(wait_time)
             else:
                 logger.error(f"所有重连尝试失败，放弃连接到 {url}")
                 raise last_exception
 
 
-async def handle_connection_error(name: str, error: Exception) -> bool:
-    """
-    处理连接错误，如果是可恢复的错误则尝试重连
-    返回True表示已处理（可能重连成功），False表示无法处理
-    """
-    error_str = str(error).lower()
-
-    # 检查是否是可重连的错误
-    recoverable_errors = [
+# 可重连的错误关键字
+_RECOVERABLE_ERROR_MATCHER = KeywordMatcher(
+    (keyword, True)
+    for keyword in (
         "502 bad gateway",
         "503 service unavailable",
         "504 gateway timeout",
@@ -344,18 +410,31 @@ async def handle_connection_error(name: str, error: Exception) -> bool:
         "timeout",
         "network unreachable",
         "read timeout",
-        "connect timeout"
-    ]
+        "connect timeout",
+    )
+)
+
+# 严重错误，应该立即重连
+_CRITICAL_ERROR_MATCHER = KeywordMatcher(
+    (keyword, True) for keyword in ("524", "502", "503", "504", "timeout")
+)
 
-    # 严重错误，应该立即重连
-    critical_errors = ["524", "502", "503", "504", "timeout"]
 
-    is_recoverable = any(err in error_str for err in recoverable_errors)
-    is_critical = any(err in error_str for err in critical_errors)
+async def handle_connection_error(name: str, error: Exception) -> bool:
+    """
+    处理连接错误，如果是可恢复的错误则尝试重连
+    返回True表示已处理（可能重连成功），False表示无法处理
+    """
+    error_text = str(error)
+    error_str = error_text.lower()  # 关键字匹配器区分大小写，统一转为小写后匹配
+
+    # 只有可恢复的错误才需要进一步判断是否严重
+    is_recoverable = _RECOVERABLE_ERROR_MATCHER.search(error_str)
+    is_critical = is_recoverable and _CRITICAL_ERROR_MATCHER.search(error_str)
 
     if is_recoverable:
-        logger.info(f"检测到可恢复错误: {error}")
-        reconnect_manager.record_error(name, str(error))
+        logger.info(f"检测到可恢复错误: {error_text}")
+        reconnect_manager.record_error(name, error_text)
 
         # 对于严重错误或满足重连条件的错误，尝试重连
         if is_critical or reconnect_manager.should_reconnect(name):
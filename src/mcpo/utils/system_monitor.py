@@ -8,13 +8,44 @@ import logging
 import time
 import psutil
 import gc
-from typing import Dict, List, Any, Optional
+from typing import Deque, Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass, field
+from collections import deque
+from itertools import islice
 import json
 
+from . import cache as _cache
+from . import error_recovery as _error_recovery
+from . import performance as _performance
+from . import reconnect_manager as _reconnect
+
 logger = logging.getLogger(__name__)
 
 
+# 两次CPU时间快照至少间隔这么久（秒）才有意义，更短时单独采样
+_CPU_MIN_SAMPLE = 0.5
+
+
+def _cpu_busy_total(times) -> Tuple[float, float]:
+    """从 psutil.cpu_times() 计算（忙碌时间, 总时间）"""
+    total = sum(times)
+    # Linux 的 guest 时间已计入 user/nice，避免重复计算
+    total -= getattr(times, "guest", 0.0) + getattr(times, "guest_nice", 0.0)
+    idle = times.idle + getattr(times, "iowait", 0.0)
+    return total - idle, total
+
+
+def _cpu_percent_between(start, end) -> float:
+    """两次CPU时间快照之间的平均使用率（%）"""
+    busy_start, total_start = _cpu_busy_total(start)
+    busy_end, total_end = _cpu_busy_total(end)
+    total_delta = total_end - total_start
+    if total_delta <= 0:
+        return 0.0
+    percent = (busy_end - busy_start) / total_delta * 100
+    return round(min(100.0, max(0.0, percent)), 1)
+
+
 @dataclass
 class SystemMetrics:
     """系统指标"""
@@ -44,7 +75,12 @@ class SystemMonitor:
     
     def __init__(self, metrics_history_size: int = 1000):
         self.metrics_history_size = metrics_history_size
-        self.metrics_history: List[SystemMetrics] = []
+        self.metrics_history: Deque[SystemMetrics] = deque(maxlen=metrics_history_size)
+        # 各项指标的指数加权移动平均，随每次采样增量更新
+        self._ewma_alpha = 0.1
+        self._ewma: Optional[Dict[str, float]] = None
+        # CPU时间基线（monotonic 时间, cpu_times），只由监控循环推进，临时调用不会打乱监控窗口
+        self._cpu_baseline = (time.monotonic(), psutil.cpu_times())
         self._monitoring_task: Optional[asyncio.Task] = None
         self._monitoring_interval = 30  # 30秒监控间隔
         self._is_monitoring = False
@@ -91,7 +127,7 @@ class SystemMonitor:
         """监控循环"""
         while self._is_monitoring:
             try:
-                metrics = await self.collect_metrics()
+                metrics = await self._collect_metrics(advance_cpu_baseline=True)
                 self._add_metrics(metrics)
                 
                 # 检查是否需要告警
@@ -105,23 +141,46 @@ class SystemMonitor:
                 logger.error(f"监控循环出错: {str(e)}")
                 await asyncio.sleep(5)
 
+    def _sample_cpu(self, advance_baseline: bool) -> float:
+        """计算自CPU时间基线以来的平均使用率（阻塞调用，需在线程中执行）"""
+        baseline_time, baseline_times = self._cpu_baseline
+        if time.monotonic() - baseline_time < _CPU_MIN_SAMPLE:
+            # 距基线太近时差值只是噪声，单独采样一小段时间
+            baseline_times = psutil.cpu_times()
+            time.sleep(_CPU_MIN_SAMPLE)
+        now_times = psutil.cpu_times()
+        if advance_baseline:
+            self._cpu_baseline = (time.monotonic(), now_times)
+        return _cpu_percent_between(baseline_times, now_times)
+
     async def collect_metrics(self) -> SystemMetrics:
-        """收集系统指标"""
+        """收集系统指标（CPU使用率为自上次监控采样以来的平均值）"""
+        return await self._collect_metrics(advance_cpu_baseline=False)
+
+    async def _collect_metrics(self, advance_cpu_baseline: bool) -> SystemMetrics:
+        """收集系统指标，监控循环调用时推进CPU时间基线"""
         try:
-            # 系统资源指标
-            cpu_usage = psutil.cpu_percent(interval=1)
-            memory = psutil.virtual_memory()
+            # 系统资源指标在线程中读取（非阻塞采样，避免阻塞事件循环），同时收集应用指标
+            (
+                cpu_usage,
+                memory,
+                active_connections,
+                cache_hit_rate,
+                error_rate,
+                response_time_avg,
+            ) = await asyncio.gather(
+                asyncio.to_thread(self._sample_cpu, advance_cpu_baseline),
+                asyncio.to_thread(psutil.virtual_memory),
+                self._get_active_connections(),
+                self._get_cache_hit_rate(),
+                self._get_error_rate(),
+                self._get_avg_response_time(),
+            )
             memory_usage = memory.percent
             memory_available = memory.available
             
-            # 应用指标
-            active_connections = await self._get_active_connections()
-            cache_hit_rate = await self._get_cache_hit_rate()
-            error_rate = await self._get_error_rate()
-            response_time_avg = await self._get_avg_response_time()
-            
             # GC指标
-            gc_collections = sum(gc.get_stats()[i]['collections'] for i in range(len(gc.get_stats())))
+            gc_collections = sum(stats['collections'] for stats in gc.get_stats())
             
             return SystemMetrics(
                 cpu_usage=cpu_usage,
@@ -141,16 +200,14 @@ class SystemMonitor:
     async def _get_active_connections(self) -> int:
         """获取活跃连接数"""
         try:
-            from .reconnect_manager import reconnect_manager
-            return len(reconnect_manager.connections)
+            return _reconnect.reconnect_manager._connection_count
         except Exception:
             return 0
 
     async def _get_cache_hit_rate(self) -> float:
         """获取缓存命中率"""
         try:
-            from .cache import cache_manager
-            stats = cache_manager.default_cache.get_stats()
+            stats = _cache.cache_manager.default_cache.get_stats()
             total_requests = stats.get('total_requests', 0)
             hits = stats.get('hits', 0)
             
@@ -163,63 +220,86 @@ class SystemMonitor:
     async def _get_error_rate(self) -> float:
         """获取错误率"""
         try:
-            from .error_recovery import error_recovery_manager
-            return error_recovery_manager.system_health.error_rate
+            return _error_recovery.error_recovery_manager.system_health.error_rate
         except Exception:
             return 0.0
 
     async def _get_avg_response_time(self) -> float:
         """获取平均响应时间"""
         try:
-            from .performance import performance_monitor
-            metrics = performance_monitor.get_metrics()
+            metrics = _performance.performance_monitor.get_metrics()
             return metrics.get('avg_response_time', 0.0)
         except Exception:
             return 0.0
 
     def _add_metrics(self, metrics: SystemMetrics):
-        """添加指标到历史记录"""
+        """添加指标到历史记录（超出 metrics_history_size 时由 deque 自动淘汰最旧的记录）"""
         self.metrics_history.append(metrics)
-        
-        # 限制历史记录大小
-        if len(self.metrics_history) > self.metrics_history_size:
-            self.metrics_history = self.metrics_history[-self.metrics_history_size:]
+        self._update_ewma(metrics)
+
+    def _update_ewma(self, metrics: SystemMetrics):
+        """增量更新指数加权移动平均，第一次采样直接作为初始值"""
+        samples = {
+            "cpu_usage": metrics.cpu_usage,
+            "memory_usage": metrics.memory_usage,
+            "error_rate": metrics.error_rate,
+            "response_time": metrics.response_time_avg,
+        }
+        if self._ewma is None:
+            self._ewma = samples
+            return
+        alpha = self._ewma_alpha
+        ewma = self._ewma
+        for key, value in samples.items():
+            ewma[key] = alpha * value + (1 - alpha) * ewma[key]
+
+    def _metrics_since(self, cutoff_time: float) -> List[SystemMetrics]:
+        """取出时间戳晚于 cutoff_time 的指标；历史按采样时间顺序追加，从尾部向前扫描到截止时间即停止"""
+        recent_metrics = []
+        for m in reversed(self.metrics_history):
+            if m.timestamp <= cutoff_time:
+                break
+            recent_metrics.append(m)
+        recent_metrics.reverse()
+        return recent_metrics
 
     async def _check_alerts(self, metrics: SystemMetrics):
-        """检查告警条件"""
-        alerts = []
-        
+        """检查告警条件（直接写日志，正常情况下不产生任何告警字符串）"""
+        # 每次检查只读取一次阈值字典，对 thresholds 的修改在下一次检查时生效
+        t = self.thresholds
+        cpu_warn, cpu_crit = t["cpu_usage_warning"], t["cpu_usage_critical"]
+        mem_warn, mem_crit = t["memory_usage_warning"], t["memory_usage_critical"]
+        err_warn, err_crit = t["error_rate_warning"], t["error_rate_critical"]
+        rt_warn, rt_crit = t["response_time_warning"], t["response_time_critical"]
+        cache_warn = t["cache_hit_rate_warning"]
+
         # CPU使用率告警
-        if metrics.cpu_usage > self.thresholds["cpu_usage_critical"]:
-            alerts.append(f"CPU使用率过高: {metrics.cpu_usage:.1f}%")
-        elif metrics.cpu_usage > self.thresholds["cpu_usage_warning"]:
-            alerts.append(f"CPU使用率警告: {metrics.cpu_usage:.1f}%")
+        if metrics.cpu_usage > cpu_crit:
+            logger.warning("系统告警: CPU使用率过高: %.1f%%", metrics.cpu_usage)
+        elif metrics.cpu_usage > cpu_warn:
+            logger.warning("系统告警: CPU使用率警告: %.1f%%", metrics.cpu_usage)
         
         # 内存使用率告警
-        if metrics.memory_usage > self.thresholds["memory_usage_critical"]:
-            alerts.append(f"内存使用率过高: {metrics.memory_usage:.1f}%")
-        elif metrics.memory_usage > self.thresholds["memory_usage_warning"]:
-            alerts.append(f"内存使用率警告: {metrics.memory_usage:.1f}%")
+        if metrics.memory_usage > mem_crit:
+            logger.warning("系统告警: 内存使用率过高: %.1f%%", metrics.memory_usage)
+        elif metrics.memory_usage > mem_warn:
+            logger.warning("系统告警: 内存使用率警告: %.1f%%", metrics.memory_usage)
         
         # 错误率告警
-        if metrics.error_rate > self.thresholds["error_rate_critical"]:
-            alerts.append(f"错误率过高: {metrics.error_rate:.3f}")
-        elif metrics.error_rate > self.thresholds["error_rate_warning"]:
-            alerts.append(f"错误率警告: {metrics.error_rate:.3f}")
+        if metrics.error_rate > err_crit:
+            logger.warning("系统告警: 错误率过高: %.3f", metrics.error_rate)
+        elif metrics.error_rate > err_warn:
+            logger.warning("系统告警: 错误率警告: %.3f", metrics.error_rate)
         
         # 响应时间告警
-        if metrics.response_time_avg > self.thresholds["response_time_critical"]:
-            alerts.append(f"响应时间过长: {metrics.response_time_avg:.2f}s")
-        elif metrics.response_time_avg > self.thresholds["response_time_warning"]:
-            alerts.append(f"响应时间警告: {metrics.response_time_avg:.2f}s")
+        if metrics.response_time_avg > rt_crit:
+            logger.warning("系统告警: 响应时间过长: %.2fs", metrics.response_time_avg)
+        elif metrics.response_time_avg > rt_warn:
+            logger.warning("系统告警: 响应时间警告: %.2fs", metrics.response_time_avg)
         
         # 缓存命中率告警
-        if metrics.cache_hit_rate < self.thresholds["cache_hit_rate_warning"]:
-            alerts.append(f"缓存命中率过低: {metrics.cache_hit_rate:.2f}")
-        
-        # 记录告警
-        for alert in alerts:
-            logger.warning(f"系统告警: {alert}")
+        if metrics.cache_hit_rate < cache_warn:
+            logger.warning("系统告警: 缓存命中率过低: %.2f", metrics.cache_hit_rate)
 
     async def diagnose_system(self) -> DiagnosticResult:
         """系统诊断"""
@@ -281,41 +361,70 @@ class SystemMonitor:
         """获取指标摘要"""
         try:
             cutoff_time = time.time() - (minutes * 60)
-            recent_metrics = [m for m in self.metrics_history if m.timestamp > cutoff_time]
+            recent_metrics = self._metrics_since(cutoff_time)
             
             if not recent_metrics:
                 return {"error": "没有足够的历史数据"}
             
-            # 计算统计值
-            cpu_values = [m.cpu_usage for m in recent_metrics]
-            memory_values = [m.memory_usage for m in recent_metrics]
-            error_rates = [m.error_rate for m in recent_metrics]
-            response_times = [m.response_time_avg for m in recent_metrics]
-            
+            # 单次遍历同时计算各项统计值
+            first = recent_metrics[0]
+            cpu_sum = cpu_max = cpu_min = first.cpu_usage
+            mem_sum = mem_max = mem_min = first.memory_usage
+            err_sum = err_max = first.error_rate
+            rt_sum = rt_max = first.response_time_avg
+            for m in islice(recent_metrics, 1, None):
+                cpu = m.cpu_usage
+                cpu_sum += cpu
+                if cpu > cpu_max:
+                    cpu_max = cpu
+                elif cpu < cpu_min:
+                    cpu_min = cpu
+                mem = m.memory_usage
+                mem_sum += mem
+                if mem > mem_max:
+                    mem_max = mem
+                elif mem < mem_min:
+                    mem_min = mem
+                err = m.error_rate
+                err_sum += err
+                if err > err_max:
+                    err_max = err
+                rt = m.response_time_avg
+                rt_sum += rt
+                if rt > rt_max:
+                    rt_max = rt
+
+            count = len(recent_metrics)
+            last = recent_metrics[-1]
+            ewma = self._ewma
             return {
                 "time_range_minutes": minutes,
-                "data_points": len(recent_metrics),
+                "data_points": count,
                 "cpu_usage": {
-                    "avg": sum(cpu_values) / len(cpu_values),
-                    "max": max(cpu_values),
-                    "min": min(cpu_values)
+                    "avg": cpu_sum / count,
+                    "max": cpu_max,
+                    "min": cpu_min,
+                    "ewma": ewma["cpu_usage"]
                 },
                 "memory_usage": {
-                    "avg": sum(memory_values) / len(memory_values),
-                    "max": max(memory_values),
-                    "min": min(memory_values)
+                    "avg": mem_sum / count,
+                    "max": mem_max,
+                    "min": mem_min,
+                    "ewma": ewma["memory_usage"]
                 },
                 "error_rate": {
-                    "avg": sum(error_rates) / len(error_rates),
-                    "max": max(error_rates),
-                    "current": recent_metrics[-1].error_rate if recent_metrics else 0
+                    "avg": err_sum / count,
+                    "max": err_max,
+                    "current": last.error_rate,
+                    "ewma": ewma["error_rate"]
                 },
                 "response_time": {
-                    "avg": sum(response_times) / len(response_times),
-                    "max": max(response_times),
-                    "current": recent_metrics[-1].response_time_avg if recent_metrics else 0
+                    "avg": rt_sum / count,
+                    "max": rt_max,
+                    "current": last.response_time_avg,
+                    "ewma": ewma["response_time"]
                 },
-                "current_connections": recent_metrics[-1].active_connections if recent_metrics else 0
+                "current_connections": last.active_connections
             }
             
         except Exception as e: